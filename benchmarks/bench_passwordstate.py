@@ -0,0 +1,131 @@
+""" PasswordState benchmarks """
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from ansible.module_utils.passwordstate.client import Password
+from ansible.module_utils.passwordstate.client import PasswordState
+from fake_server import ID_BASE
+from passwordstate_password import update_passwords
+from passwordstate_password_fact import gather_facts
+
+# every scenario starts from a new client, the way each module run does
+
+# lookups in the batch scenarios
+BATCH = 50
+
+
+def make_lookup(fact_name, password_id=None, match_field=None, match_field_id=None):
+    """a lookups item of the fact module"""
+    return {
+        "fact_name": fact_name,
+        "password_list_id": None,
+        "password_id": password_id,
+        "match_field": match_field,
+        "match_field_id": match_field_id,
+        "match_field2": None,
+        "match_field2_id": None,
+    }
+
+
+def make_item(match_field_id, password):
+    """a passwords item of the password module"""
+    return {
+        "password_list_id": None,
+        "password_id": None,
+        "match_field": "GenericField1",
+        "match_field_id": match_field_id,
+        "title": None,
+        "username": None,
+        "password": password,
+    }
+
+
+def resolve(api, lookups, max_workers=1):
+    facts, errors = gather_facts(api, "1", lookups, max_workers)
+    assert not errors, errors
+    return facts
+
+
+def test_fact_password_id(measure, server, list_size):
+    """a single fact looked up by password id"""
+    lookups = [make_lookup("fact", password_id=str(ID_BASE + 1))]
+    measure(lambda: resolve(PasswordState(server.url, "key"), lookups))
+
+
+def test_fact_password_id_winapi(measure, server, list_size):
+    """a single fact looked up by password id on the Windows API"""
+    lookups = [make_lookup("fact", password_id=str(ID_BASE + 1))]
+    measure(lambda: resolve(PasswordState(server.url, None, "user", "pass"), lookups))
+
+
+@pytest.mark.parametrize("strategy", ["search", "list"])
+def test_fact_match_field(measure, server, list_size, strategy):
+    """a single fact looked up by match field"""
+    lookups = [
+        make_lookup(
+            "fact", match_field="GenericField1", match_field_id="host%d" % list_size
+        )
+    ]
+    measure(
+        lambda: resolve(
+            PasswordState(server.url, "key", lookup_strategy=strategy), lookups
+        )
+    )
+
+
+def test_update(measure, server, list_size):
+    """a single password updated by match field"""
+
+    def update():
+        api = PasswordState(server.url, "key")
+        password = Password(
+            api, "1", {"field": "GenericField1", "field_id": "host%d" % list_size}
+        )
+        plan = api.plan_update(password, {"password": "new password"})
+        assert plan.method == "PUT"
+        api.write(plan)
+
+    measure(update)
+
+
+def test_batch_facts(measure, server, list_size):
+    """many facts looked up by match field in one task"""
+    lookups = [
+        make_lookup(
+            "fact%d" % n, match_field="GenericField1", match_field_id="host%d" % n
+        )
+        for n in range(1, min(BATCH, list_size) + 1)
+    ]
+    measure(lambda: resolve(PasswordState(server.url, "key"), lookups, 4))
+
+
+def test_batch_update(measure, server, list_size):
+    """many passwords updated by match field in one task"""
+    items = [
+        make_item("host%d" % n, "new password")
+        for n in range(1, min(BATCH, list_size) + 1)
+    ]
+
+    def update():
+        results = update_passwords(PasswordState(server.url, "key"), "1", items, 4)
+        assert all(result["status"] == "changed" for result in results), results
+
+    measure(update)
+
+
+@pytest.mark.parametrize("chunk_size", [0, 100])
+def test_batch_create(measure, server, list_size, chunk_size):
+    """many new passwords created by match field in one task"""
+    items = [make_item("new%d" % n, "password") for n in range(BATCH)]
+    for item in items:
+        item["title"] = item["match_field_id"]
+
+    def create():
+        results = update_passwords(
+            PasswordState(server.url, "key"), "1", items, 4, chunk_size=chunk_size
+        )
+        assert all(result["status"] == "created" for result in results), results
+
+    measure(create)
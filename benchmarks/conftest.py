@@ -0,0 +1,127 @@
+""" benchmark configuration """
+
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+from urllib.request import Request
+from urllib.request import urlopen
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the modules are imported the way their tests import them
+sys.path[:0] = [
+    os.path.join(ROOT, "passwordstate_password"),
+    os.path.join(ROOT, "passwordstate_password_fact"),
+]
+
+# requests, peak memory and endpoint counts of every measured scenario
+RESULTS = []
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("passwordstate benchmarks")
+    group.addoption(
+        "--list-size",
+        action="append",
+        type=int,
+        help="entries per fake password list, repeat for several (default 100 and 10000)",
+    )
+    group.addoption(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="seconds the fake server waits before every answer",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "list_size" in metafunc.fixturenames:
+        sizes = metafunc.config.getoption("list_size", None) or [100, 10000]
+        metafunc.parametrize("list_size", sizes, scope="session")
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not RESULTS:
+        return
+    terminalreporter.section("passwordstate requests and peak memory")
+    for name, requests, peak, endpoints in RESULTS:
+        terminalreporter.write_line(
+            "%-60s %5d requests %10.1f KiB  %s"
+            % (name, requests, peak / 1024.0, json.dumps(endpoints, sort_keys=True))
+        )
+
+
+class Server(object):
+    """a fake PasswordState server running in its own process"""
+
+    def __init__(self, list_size, latency):
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.join(
+                    os.path.dirname(os.path.abspath(__file__)), "fake_server.py"
+                ),
+                "--port",
+                "0",
+                "--list-size",
+                str(list_size),
+                "--latency",
+                str(latency),
+            ],
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        self.url = self.process.stdout.readline().strip()
+
+    def counts(self):
+        """the requests answered since the last reset, per endpoint"""
+        with urlopen(self.url + "/_stats") as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def reset(self):
+        """forget the requests answered so far"""
+        urlopen(Request(self.url + "/_reset", data=b"", method="POST")).close()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+@pytest.fixture(scope="session")
+def server(list_size, request):
+    """a fake server with list_size entries per list"""
+    server = Server(list_size, request.config.getoption("latency"))
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def measure(benchmark, server, request):
+    """benchmark a scenario, reporting its requests and peak memory as well
+
+    The scenario is run once more outside the timing, tracing memory and
+    counting the requests the server answered.
+    """
+
+    def run(scenario):
+        server.reset()
+        tracemalloc.start()
+        try:
+            scenario()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        endpoints = server.counts()
+        requests = sum(endpoints.values())
+        benchmark.extra_info.update(
+            requests=requests, peak_memory=peak, endpoints=endpoints
+        )
+        RESULTS.append((request.node.name, requests, peak, endpoints))
+        return benchmark(scenario)
+
+    return run
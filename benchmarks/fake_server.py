@@ -0,0 +1,202 @@
+""" Local stand-in for the PasswordState API """
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+# the value of a field on entry n of a list, so searches need no scan
+FIELDS = {
+    "Title": "title%d",
+    "UserName": "user%d",
+    "GenericField1": "host%d",
+}
+
+# password ids are list_id * ID_BASE + n, telling lists and passwords apart
+ID_BASE = 1000000
+
+
+def make_record(list_id, n, exclude_password=False):
+    """entry n of a password list"""
+    record = dict((field, value % n) for field, value in FIELDS.items())
+    record.update(
+        {
+            "PasswordID": list_id * ID_BASE + n,
+            "PasswordListID": list_id,
+            "Description": "description of entry %d" % n,
+            "Notes": "notes " * 10,
+            "URL": "https://host%d.example.com" % n,
+            "HostName": "host%d.example.com" % n,
+            "Domain": "example.com",
+            "AccountType": "",
+            "AccountTypeID": 0,
+            "ExpiryDate": "",
+            "GenericFieldInfo": [],
+        }
+    )
+    for i in range(2, 11):
+        record["GenericField%d" % i] = ""
+    if not exclude_password:
+        record["Password"] = "password%d" % n
+    return record
+
+
+class FakePasswordState(ThreadingHTTPServer):
+    """serves password lists of list_size entries under /api and /winapi
+
+    Entry n of every list has the field values of FIELDS, its password is
+    "password<n>". Every request waits latency seconds before it is
+    answered and is counted per method and endpoint; GET /_stats returns
+    the counts and POST /_reset clears them.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, list_size=100, latency=0.0):
+        ThreadingHTTPServer.__init__(self, address, Handler)
+        self.list_size = list_size
+        self.latency = latency
+        self.counts = {}
+        self.lock = threading.Lock()
+        self._lists = {}
+
+    def count(self, key):
+        """count a request"""
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def list_body(self, list_id):
+        """the encoded QueryAll answer of a list, built once"""
+        with self.lock:
+            if list_id not in self._lists:
+                self._lists[list_id] = json.dumps(
+                    [
+                        make_record(list_id, n, exclude_password=True)
+                        for n in range(1, self.list_size + 1)
+                    ]
+                ).encode("utf-8")
+            return self._lists[list_id]
+
+    def search(self, list_id, params):
+        """the entries matching every searched field"""
+        found = None
+        for field, values in params.items():
+            if field not in FIELDS:
+                continue
+            prefix = FIELDS[field].split("%")[0]
+            try:
+                n = int(values[0][len(prefix) :])
+            except ValueError:
+                return []
+            if FIELDS[field] % n != values[0] or not 0 < n <= self.list_size:
+                return []
+            if found not in (None, n):
+                return []
+            found = n
+        if found is None:
+            return []
+        return [make_record(list_id, found, exclude_password=True)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    """answers the PasswordState API calls the modules make"""
+
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, which Nagle would delay
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/_stats":
+            with self.server.lock:
+                return self.send_json(dict(self.server.counts))
+        parts = self.api_path(url)
+        if parts is None:
+            return None
+        params = parse_qs(url.query, keep_blank_values=True)
+        if parts[0] == "searchpasswords" and len(parts) == 2:
+            self.server.count("GET searchpasswords/{id}")
+            return self.send_json(self.server.search(int(parts[1]), params))
+        if parts[0] == "passwords" and len(parts) == 2:
+            if "QueryAll" in params:
+                self.server.count("GET passwords/{id}?QueryAll")
+                # lists never change, so their size makes a stable etag
+                etag = '"%s-%d"' % (parts[1], self.server.list_size)
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send_body(b"", 304, etag)
+                return self.send_body(self.server.list_body(int(parts[1])), etag=etag)
+            self.server.count("GET passwords/{id}")
+            list_id, n = divmod(int(parts[1]), ID_BASE)
+            if not 0 < n <= self.server.list_size:
+                return self.send_json([])
+            return self.send_json([make_record(list_id, n)])
+        return self.send_json({"error": "not found"}, 404)
+
+    def do_PUT(self):
+        self.write_password("PUT")
+
+    def do_POST(self):
+        if self.path == "/_reset":
+            with self.server.lock:
+                self.server.counts.clear()
+            return self.send_json({})
+        return self.write_password("POST")
+
+    def write_password(self, method):
+        """accept an update, a new password or a bulk of new passwords"""
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        parts = self.api_path(urlparse(self.path))
+        if parts is None:
+            return None
+        if parts == ["bulkaddpasswords"] and method == "POST":
+            self.server.count("POST bulkaddpasswords")
+            created = json.loads(body.decode("utf-8"))
+            return self.send_json([{"PasswordID": 0} for entry in created])
+        self.server.count(method + " passwords")
+        return self.send_json([{"PasswordID": 0}])
+
+    def api_path(self, url):
+        """the path parts after /api or /winapi, after the injected latency"""
+        parts = url.path.strip("/").split("/")
+        if parts[0] not in ("api", "winapi"):
+            self.send_json({"error": "not found"}, 404)
+            return None
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        return parts[1:]
+
+    def send_json(self, value, status=200):
+        self.send_body(json.dumps(value).encode("utf-8"), status)
+
+    def send_body(self, body, status=200, etag=None):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    """main"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--list-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakePasswordState(("127.0.0.1", args.port), args.list_size, args.latency)
+    print("http://127.0.0.1:%d" % server.server_address[1], flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+""" pytest configuration """
+
+import os
+
+import ansible.module_utils
+
+# make the shared module_utils importable the way ansible ships them
+ansible.module_utils.__path__.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "module_utils")
+)
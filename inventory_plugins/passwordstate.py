@@ -0,0 +1,235 @@
+""" PasswordState Ansible Inventory Plugin """
+
+DOCUMENTATION = """
+name: passwordstate
+short_description: hosts and their credentials from PasswordState password lists
+description:
+  - Downloads every password list once and adds a host for each entry,
+    named after the entry's O(host_field).
+  - The entries of a host are kept in its O(var_name) variable, keyed by
+    O(key_field). Each holds the entry's O(fields), its C(passwordid) and a
+    C(password) that is only fetched, by the passwordstate lookup, when a
+    task uses it.
+  - The list downloads never contain passwords, so neither does the
+    inventory cache.
+extends_documentation_fragment:
+  - constructed
+  - inventory_cache
+options:
+  plugin:
+    description: Marks the file as a passwordstate inventory source.
+    required: true
+    choices: [passwordstate]
+  url:
+    description: The PasswordState url.
+    required: true
+    env:
+      - name: PASSWORDSTATE_URL
+  api_key:
+    description: The API key of the password lists.
+    env:
+      - name: PASSWORDSTATE_API_KEY
+  api_username:
+    description: Username for the Windows authentication API.
+    env:
+      - name: PASSWORDSTATE_API_USERNAME
+  api_password:
+    description: Password for the Windows authentication API.
+    env:
+      - name: PASSWORDSTATE_API_PASSWORD
+  password_list_ids:
+    description: The password lists to read hosts from.
+    type: list
+    elements: str
+    required: true
+  host_field:
+    description: The entry field naming the host, entries without it are skipped.
+    default: HostName
+  key_field:
+    description: The entry field the entries of a host are keyed by.
+    default: Title
+  fields:
+    description: The entry fields to expose, by their lowercased names.
+    type: list
+    elements: str
+    default: [UserName]
+  var_name:
+    description: The host variable holding the entries.
+    default: passwordstate
+  max_workers:
+    description: The number of password lists downloaded at once.
+    type: int
+    default: 4
+  pool_size:
+    description: The number of pooled connections.
+    type: int
+    default: 10
+  retries:
+    description: How often a dropped connection or busy server answer is retried.
+    type: int
+    default: 3
+"""
+
+EXAMPLES = """
+# passwordstate.yml
+plugin: passwordstate
+url: https://passwordstate.internal.corp.net
+password_list_ids: ['12', '13']
+host_field: GenericField1
+fields: [UserName, Description]
+cache: true
+cache_plugin: jsonfile
+cache_connection: ~/.cache/passwordstate-inventory
+cache_timeout: 3600
+keyed_groups:
+  - key: passwordstate.keys() | list
+    prefix: account
+
+# in a play: {{ passwordstate['db admin'].username }} and, fetched only
+# here, {{ passwordstate['db admin'].password }}
+"""
+
+import concurrent.futures
+import json
+import os
+
+from ansible.errors import AnsibleError
+from ansible.plugins.inventory import BaseInventoryPlugin, Cacheable, Constructable
+from ansible.utils.unsafe_proxy import wrap_var
+
+try:
+    from ansible.template import trust_as_template
+except ImportError:
+    # before ansible-core 2.19 every inventory string may be a template
+    def trust_as_template(value):
+        return value
+
+
+try:
+    from ansible.module_utils.passwordstate.client import PasswordState
+except ImportError:
+    # outside a collection the repository's module_utils are only shipped
+    # with modules, so make them importable on the controller as well
+    import ansible.module_utils
+
+    ansible.module_utils.__path__.append(
+        os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "module_utils",
+        )
+    )
+    from ansible.module_utils.passwordstate.client import PasswordState
+
+from ansible.module_utils.passwordstate.client import CREDENTIALS
+from ansible.module_utils.passwordstate.client import PasswordStateException
+
+
+class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
+    """InventoryModule"""
+
+    NAME = "passwordstate"
+
+    def verify_file(self, path):
+        """only files named like passwordstate.yml are read"""
+        return super(InventoryModule, self).verify_file(path) and path.endswith(
+            ("passwordstate.yml", "passwordstate.yaml")
+        )
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path)
+        self._read_config_data(path)
+
+        url = self.get_option("url")
+        api_key = self.get_option("api_key")
+        api_username = self.get_option("api_username")
+        api_password = self.get_option("api_password")
+        if (api_key is None) == (api_username is None):
+            raise AnsibleError("Exactly one of api_key or api_username is required")
+        # the lookups left in hostvars run in this process's workers
+        CREDENTIALS[url] = (api_key, api_username, api_password)
+
+        cache_key = self.get_cache_key(path)
+        use_cache = self.get_option("cache") and cache
+        update_cache = self.get_option("cache") and not cache
+        records = None
+        if use_cache:
+            try:
+                records = self._cache[cache_key]
+            except KeyError:
+                update_cache = True
+        if records is None:
+            records = self._get_records(url, api_key, api_username, api_password)
+        if update_cache:
+            self._cache[cache_key] = records
+
+        self._populate(url, records)
+
+    def _get_records(self, url, api_key, api_username, api_password):
+        """download every password list once, keeping the needed fields"""
+        api = PasswordState(
+            url,
+            api_key,
+            api_username,
+            api_password,
+            pool_size=self.get_option("pool_size"),
+            retries=self.get_option("retries"),
+            lookup_strategy="list",
+        )
+        columns = set(self.get_option("fields"))
+        columns.update([self.get_option("host_field"), self.get_option("key_field")])
+
+        def download(list_id):
+            list_id = str(list_id)
+            index = api._get_password_list(list_id, columns)
+            return [dict(record, PasswordListID=list_id) for record in index.passwords]
+
+        # create the shared session before the workers start using it
+        api.session
+        max_workers = self.get_option("max_workers")
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+                lists = list(
+                    executor.map(download, self.get_option("password_list_ids"))
+                )
+        except PasswordStateException as inst:
+            raise AnsibleError("PasswordState inventory failed: %s" % inst.msg)
+        return [record for records in lists for record in records]
+
+    def _populate(self, url, records):
+        """add the hosts of the records with their entries as hostvars"""
+        host_field = self.get_option("host_field")
+        key_field = self.get_option("key_field")
+        fields = self.get_option("fields")
+        strict = self.get_option("strict")
+
+        entries = {}
+        for record in records:
+            if not record.get(host_field):
+                continue
+            entry = dict(
+                (field.lower(), wrap_var(record.get(field))) for field in fields
+            )
+            entry["passwordid"] = record["PasswordID"]
+            entry["password_list_id"] = record["PasswordListID"]
+            entry["password"] = trust_as_template(
+                "{{ lookup('passwordstate', %s, url=%s) }}"
+                % (json.dumps(str(record["PasswordID"])), json.dumps(url))
+            )
+            host = str(record[host_field])
+            key = str(record.get(key_field) or record["PasswordID"])
+            entries.setdefault(host, {})[key] = entry
+
+        var_name = self.get_option("var_name")
+        for host, host_entries in entries.items():
+            self.inventory.add_host(host)
+            self.inventory.set_variable(host, var_name, host_entries)
+            hostvars = self.inventory.get_host(host).get_vars()
+            self._set_composite_vars(
+                self.get_option("compose"), hostvars, host, strict=strict
+            )
+            self._add_host_to_composed_groups(
+                self.get_option("groups"), hostvars, host, strict=strict
+            )
+            self._add_host_to_keyed_groups(
+                self.get_option("keyed_groups"), hostvars, host, strict=strict
+            )
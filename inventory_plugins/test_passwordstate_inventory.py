@@ -0,0 +1,83 @@
+""" PasswordState Test """
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ansible.errors import AnsibleError
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.loader import inventory_loader
+from ansible.module_utils.passwordstate.client import CREDENTIALS
+from testhelpers import make_response
+import mock
+
+inventory_loader.add_directory(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRIES = [
+    {"PasswordID": 1, "Title": "admin", "UserName": "root", "HostName": "web1"},
+    {"PasswordID": 2, "Title": "app", "UserName": "app", "HostName": "web1"},
+    {"PasswordID": 3, "Title": "{{ 7 * 7 }}", "UserName": "x", "HostName": "db1"},
+    {"PasswordID": 4, "Title": "shared", "UserName": "y", "HostName": None},
+]
+
+
+class InventoryModuleTest(unittest.TestCase):
+    """InventoryModuleTest"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.config = os.path.join(self.path, "passwordstate.yml")
+        with open(self.config, "w") as config:
+            config.write(
+                "plugin: passwordstate\n"
+                "url: http://passwordstate\n"
+                "api_key: abc123xyz\n"
+                "password_list_ids: ['12']\n"
+                "keyed_groups:\n"
+                "  - key: passwordstate.keys() | list\n"
+                "    prefix: account\n"
+            )
+        self.plugin = inventory_loader.get("passwordstate")
+        self.inventory = InventoryData()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        CREDENTIALS.clear()
+
+    def test_verify_file(self):
+        """only passwordstate.yml files are inventory sources"""
+        self.assertTrue(self.plugin.verify_file(self.config))
+        self.assertFalse(self.plugin.verify_file(self.config[:-17] + "hosts.yml"))
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_parse(self, mock_get):
+        """one list download fills the hostvars, passwords stay lookups"""
+        mock_get.return_value = make_response(ENTRIES)
+
+        self.plugin.parse(self.inventory, DataLoader(), self.config, cache=False)
+
+        self.assertEqual(1, mock_get.call_count)
+        self.assertIn("ExcludePassword=true", mock_get.call_args[0][1])
+        self.assertEqual(["db1", "web1"], sorted(self.inventory.hosts))
+        entries = self.inventory.get_host("web1").vars["passwordstate"]
+        self.assertEqual(["admin", "app"], sorted(entries))
+        self.assertEqual("root", entries["admin"]["username"])
+        self.assertEqual(1, entries["admin"]["passwordid"])
+        self.assertEqual(
+            '{{ lookup(\'passwordstate\', "1", url="http://passwordstate") }}',
+            entries["admin"]["password"],
+        )
+        self.assertIn(
+            "web1", self.inventory.groups["account_admin"].get_hosts()[0].name
+        )
+        self.assertEqual(("abc123xyz", None, None), CREDENTIALS["http://passwordstate"])
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_parse_failed(self, mock_get):
+        """a failed list download fails the inventory source"""
+        mock_get.return_value = make_response({"error": "denied"}, 403)
+
+        with self.assertRaises(AnsibleError):
+            self.plugin.parse(self.inventory, DataLoader(), self.config, cache=False)
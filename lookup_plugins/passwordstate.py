@@ -0,0 +1,260 @@
+""" PasswordState Ansible Lookup Plugin """
+
+DOCUMENTATION = """
+name: passwordstate
+short_description: fetch passwords from PasswordState
+description:
+  - Fetches passwords from PasswordState inside the controller process.
+  - The connection pool and the downloaded password lists are kept for the
+    lifetime of the process, and so are the last 128 fetched records, so
+    repeated lookups reuse them instead of asking the API again.
+  - Ansible runs each task in a forked worker, set O(cache_path) to share
+    the downloaded lists between tasks as well.
+options:
+  _terms:
+    description: Password ids to fetch. Leave empty to match on a field.
+    required: false
+  url:
+    description: The PasswordState url.
+    required: true
+    env:
+      - name: PASSWORDSTATE_URL
+  api_key:
+    description:
+      - The API key of the password list(s).
+      - Without O(api_key) and O(api_username), the credentials the passwordstate
+        inventory plugin was configured with for O(url) are used.
+    env:
+      - name: PASSWORDSTATE_API_KEY
+  api_username:
+    description: Username for the Windows authentication API.
+    env:
+      - name: PASSWORDSTATE_API_USERNAME
+  api_password:
+    description: Password for the Windows authentication API.
+    env:
+      - name: PASSWORDSTATE_API_PASSWORD
+  password_list_id:
+    description: The password list to match in.
+  match_field:
+    description: The field to match on.
+  match_field_id:
+    description: The value match_field must have.
+  match_field2:
+    description: A second field to match on.
+  match_field2_id:
+    description: The value match_field2 must have.
+  field:
+    description: The record field to return, the whole record when empty.
+    default: Password
+  lazy:
+    description:
+      - With an empty O(field), return the record as a mapping whose fields
+        are only fetched when they are first read.
+      - Reading fields other than C(Password) fetches the record without the
+        password, the password is only fetched once it is read itself.
+    type: bool
+    default: false
+  lookup_strategy:
+    description:
+      - How match fields are resolved, see the modules' option of the same name.
+      - Defaults to C(list) so that the downloaded list serves every later lookup.
+    default: list
+    choices: [auto, search, list]
+  pool_size:
+    description: The number of pooled connections.
+    type: int
+    default: 10
+  retries:
+    description: How often a dropped connection or busy server answer is retried.
+    type: int
+    default: 3
+  retry_backoff:
+    description: Base seconds of the jittered exponential backoff between retries.
+    type: float
+    default: 1.0
+  rate_limit:
+    description: Requests per second sent to the server, unlimited when empty.
+    type: float
+  cache_path:
+    description:
+      - Directory of the encrypted password list cache, no cache when empty.
+      - Only list entries are cached, never passwords.
+    type: path
+    env:
+      - name: PASSWORDSTATE_CACHE_PATH
+  cache_ttl:
+    description: Seconds a cached password list stays valid.
+    type: int
+    default: 300
+"""
+
+EXAMPLES = """
+- debug:
+    msg: "{{ lookup('passwordstate', '999', url='https://passwordstate', api_key='xxx') }}"
+
+- debug:
+    msg: >-
+      {{ lookup('passwordstate', url='https://passwordstate', api_key='xxx',
+                password_list_id='2', match_field='GenericField1',
+                match_field_id=inventory_hostname, field='UserName') }}
+
+# only the record without its password is fetched; set_fact would store,
+# and so fetch, every field
+- debug:
+    msg: "{{ account.UserName }}"
+  vars:
+    account: "{{ lookup('passwordstate', '999', url='https://passwordstate',
+                         api_key='xxx', field='', lazy=true) }}"
+"""
+
+RETURN = """
+_raw:
+  description: The requested field (or whole record) of every password.
+  type: list
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from ansible.errors import AnsibleError
+from ansible.plugins.lookup import LookupBase
+
+try:
+    from ansible.module_utils.passwordstate.client import Password
+except ImportError:
+    # outside a collection the repository's module_utils are only shipped
+    # with modules, so make them importable on the controller as well
+    import ansible.module_utils
+
+    ansible.module_utils.__path__.append(
+        os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "module_utils",
+        )
+    )
+    from ansible.module_utils.passwordstate.client import Password
+
+from ansible.module_utils.passwordstate.cache import HAS_CRYPTOGRAPHY
+from ansible.module_utils.passwordstate.cache import ListCache
+from ansible.module_utils.passwordstate.cache import cache_secret
+from ansible.module_utils.passwordstate.client import CREDENTIALS
+from ansible.module_utils.passwordstate.client import LazyRecord
+from ansible.module_utils.passwordstate.client import PasswordIdException
+from ansible.module_utils.passwordstate.client import PasswordState
+from ansible.module_utils.passwordstate.client import PasswordStateException
+
+# clients shared by every lookup in this process, each with the records
+# it fetched most recently
+_CLIENTS = {}
+_LOCK = threading.Lock()
+# records kept per client, the least recently used are dropped first
+MAX_RECORDS = 128
+
+
+def get_client(
+    url, api_key, api_username, api_password, cache_path=None, cache_ttl=300, **kwargs
+):
+    """get the process-wide client for the given url and credentials, with
+    its records"""
+    # every option configuring the client, so lookups differing in any of
+    # them get their own
+    key = (url, api_key, api_username, api_password, cache_path, cache_ttl) + tuple(
+        sorted(kwargs.items())
+    )
+    with _LOCK:
+        if key not in _CLIENTS:
+            cache = None
+            if cache_path:
+                secret = cache_secret(api_key, api_username, api_password)
+                cache = ListCache(cache_path, cache_ttl, secret, url)
+            api = PasswordState(
+                url, api_key, api_username, api_password, cache=cache, **kwargs
+            )
+            _CLIENTS[key] = (api, OrderedDict())
+        return _CLIENTS[key]
+
+
+def get_record(api, records, password_list_id, matcher):
+    """get a password record of a client, fetching its fields only when
+    first read"""
+    key = (password_list_id, tuple(sorted(matcher.items())))
+    with _LOCK:
+        if key in records:
+            records.move_to_end(key)
+            return records[key]
+    # fail on incomplete matchers before anything is fetched
+    Password(api, password_list_id, matcher)
+    record = LazyRecord(api, password_list_id, matcher)
+    with _LOCK:
+        records[key] = record
+        if len(records) > MAX_RECORDS:
+            records.popitem(last=False)
+    return record
+
+
+class LookupModule(LookupBase):
+    """LookupModule"""
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+        api_key = self.get_option("api_key")
+        api_username = self.get_option("api_username")
+        api_password = self.get_option("api_password")
+        if api_key is None and api_username is None:
+            # fall back to the credentials the inventory plugin was given
+            api_key, api_username, api_password = CREDENTIALS.get(
+                self.get_option("url"), (None, None, None)
+            )
+        if (api_key is None) == (api_username is None):
+            raise AnsibleError("Exactly one of api_key or api_username is required")
+        if (api_username is None) != (api_password is None):
+            raise AnsibleError("api_username and api_password are required together")
+
+        if self.get_option("cache_path") and not HAS_CRYPTOGRAPHY:
+            raise AnsibleError("The cryptography library is required for cache_path")
+
+        api, records = get_client(
+            self.get_option("url"),
+            api_key,
+            api_username,
+            api_password,
+            cache_path=self.get_option("cache_path"),
+            cache_ttl=self.get_option("cache_ttl"),
+            pool_size=self.get_option("pool_size"),
+            retries=self.get_option("retries"),
+            retry_backoff=self.get_option("retry_backoff"),
+            rate_limit=self.get_option("rate_limit"),
+            lookup_strategy=self.get_option("lookup_strategy"),
+        )
+        if terms:
+            matchers = [{"id": str(term)} for term in terms]
+        else:
+            matchers = [
+                {
+                    "field": self.get_option("match_field"),
+                    "field_id": self.get_option("match_field_id"),
+                    "field2": self.get_option("match_field2"),
+                    "field2_id": self.get_option("match_field2_id"),
+                }
+            ]
+
+        field = self.get_option("field")
+        ret = []
+        for matcher in matchers:
+            try:
+                record = get_record(
+                    api, records, self.get_option("password_list_id"), matcher
+                )
+                if field:
+                    if field not in record:
+                        raise AnsibleError("Password has no field %s" % field)
+                    ret.append(record[field])
+                elif self.get_option("lazy"):
+                    ret.append(record)
+                else:
+                    ret.append(record.fetch())
+            except (PasswordIdException, PasswordStateException) as inst:
+                raise AnsibleError("PasswordState lookup failed: %s" % inst.msg)
+        return ret
@@ -0,0 +1,181 @@
+""" PasswordState Test """
+
+import os
+import sys
+import unittest
+
+from ansible.errors import AnsibleError
+from ansible.plugins.loader import lookup_loader
+import mock
+
+lookup_loader.add_directory(os.path.dirname(os.path.abspath(__file__)))
+
+RECORD = {"PasswordID": 7, "Title": "t", "UserName": "u", "Password": "pw"}
+
+
+class LookupModuleTest(unittest.TestCase):
+    """LookupModuleTest"""
+
+    def setUp(self):
+        self.lookup = lookup_loader.get("passwordstate")
+        self.plugin = sys.modules[type(self.lookup).__module__]
+        self.plugin._CLIENTS.clear()
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_run_id(self, mock_get):
+        """records are fetched once and shared between lookups"""
+        mock_get.return_value = mock.Mock(status_code=200, json=lambda: [RECORD])
+        options = {"url": "http://passwordstate", "api_key": "abc123xyz"}
+
+        self.assertEqual(["pw"], self.lookup.run(["7"], **options))
+        other = lookup_loader.get("passwordstate")
+        self.assertEqual(["u"], other.run(["7"], field="UserName", **options))
+        self.assertEqual([RECORD], other.run(["7"], field="", **options))
+        mock_get.assert_called_once_with(
+            mock.ANY, "http://passwordstate/api/passwords/7", params=None
+        )
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_run_match_field(self, mock_get):
+        """match field lookups share one list download"""
+
+        def get(session, uri, params=None, stream=False):
+            if "QueryAll" in uri:
+                return mock.Mock(
+                    status_code=200,
+                    json=lambda: [dict(RECORD, GenericField1="a")],
+                )
+            return mock.Mock(status_code=200, json=lambda: [RECORD])
+
+        mock_get.side_effect = get
+        options = {
+            "url": "http://passwordstate",
+            "api_key": "abc123xyz",
+            "password_list_id": "3",
+            "match_field": "GenericField1",
+            "match_field_id": "a",
+        }
+
+        with mock.patch("ansible.module_utils.passwordstate.client.HAS_IJSON", False):
+            self.assertEqual(["pw"], self.lookup.run([], **options))
+            self.assertEqual(["t"], self.lookup.run([], field="Title", **options))
+        self.assertEqual(2, mock_get.call_count)
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_run_client_options(self, mock_get):
+        """lookups with other client options get a client of their own"""
+        mock_get.side_effect = lambda session, uri, params=None, stream=False: (
+            mock.Mock(status_code=200, json=lambda: [dict(RECORD, GenericField1="a")])
+        )
+        options = {
+            "url": "http://passwordstate",
+            "api_key": "abc123xyz",
+            "password_list_id": "3",
+            "match_field": "GenericField1",
+            "match_field_id": "a",
+            "field": "Title",
+        }
+
+        with mock.patch("ansible.module_utils.passwordstate.client.HAS_IJSON", False):
+            self.lookup.run([], **options)
+            self.lookup.run([], lookup_strategy="search", retries=1, **options)
+        self.assertEqual(2, len(self.plugin._CLIENTS))
+        self.assertEqual(
+            ["search", "list"],
+            sorted(
+                (api.lookup_strategy for api, records in self.plugin._CLIENTS.values()),
+                reverse=True,
+            ),
+        )
+        uris = [c[0][1] for c in mock_get.call_args_list]
+        self.assertEqual(1, len([uri for uri in uris if "QueryAll" in uri]))
+        self.assertEqual(1, len([uri for uri in uris if "searchpasswords/3" in uri]))
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_run_not_found(self, mock_get):
+        """api errors become ansible errors"""
+        mock_get.return_value = mock.Mock(status_code=200, json=lambda: [])
+
+        with self.assertRaises(AnsibleError):
+            self.lookup.run(["7"], url="http://passwordstate", api_key="abc123xyz")
+
+    def test_run_credentials(self):
+        """exactly one way of authenticating is required"""
+        with self.assertRaises(AnsibleError):
+            self.lookup.run(["7"], url="http://passwordstate")
+        with self.assertRaises(AnsibleError):
+            self.lookup.run(
+                ["7"],
+                url="http://passwordstate",
+                api_username="user",
+                cache_path="/nonexistent",
+            )
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_run_records_bounded(self, mock_get):
+        """the least recently used records are dropped and fetched again"""
+        mock_get.return_value = mock.Mock(status_code=200, json=lambda: [RECORD])
+        options = {"url": "http://passwordstate", "api_key": "abc123xyz"}
+
+        with mock.patch.object(self.plugin, "MAX_RECORDS", 2):
+            self.lookup.run(["7"], **options)
+            self.lookup.run(["8"], **options)
+            self.lookup.run(["7"], **options)
+            self.assertEqual(2, mock_get.call_count)
+            self.lookup.run(["9"], **options)
+            self.lookup.run(["7"], **options)
+            self.assertEqual(3, mock_get.call_count)
+            self.lookup.run(["8"], **options)
+            self.assertEqual(4, mock_get.call_count)
+        records = list(self.plugin._CLIENTS.values())[0][1]
+        self.assertEqual(2, len(records))
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_run_lazy(self, mock_get):
+        """lazy records fetch the password only when it is read"""
+        metadata = dict(RECORD)
+        del metadata["Password"]
+
+        def get(session, uri, params=None, stream=False):
+            if params == {"ExcludePassword": "true"}:
+                return mock.Mock(status_code=200, json=lambda: [metadata])
+            return mock.Mock(status_code=200, json=lambda: [RECORD])
+
+        mock_get.side_effect = get
+        options = {"url": "http://passwordstate", "api_key": "abc123xyz"}
+
+        record = self.lookup.run(["7"], field="", lazy=True, **options)[0]
+        mock_get.assert_not_called()
+        self.assertEqual("u", record["UserName"])
+        self.assertEqual("t", record["Title"])
+        self.assertIn("Password", record)
+        self.assertEqual(1, mock_get.call_count)
+        self.assertEqual("pw", record["Password"])
+        self.assertEqual(2, mock_get.call_count)
+        self.assertEqual(RECORD, record)
+        self.assertEqual(2, mock_get.call_count)
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_run_whole_record(self, mock_get):
+        """without lazy, a whole record takes a single fetch"""
+        mock_get.return_value = mock.Mock(status_code=200, json=lambda: [RECORD])
+        options = {"url": "http://passwordstate", "api_key": "abc123xyz"}
+
+        self.assertEqual([RECORD], self.lookup.run(["7"], field="", **options))
+        mock_get.assert_called_once_with(
+            mock.ANY, "http://passwordstate/api/passwords/7", params=None
+        )
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_run_lazy_password_first(self, mock_get):
+        """reading the password first fetches the whole record once"""
+        mock_get.return_value = mock.Mock(status_code=200, json=lambda: [RECORD])
+        options = {"url": "http://passwordstate", "api_key": "abc123xyz"}
+
+        record = self.lookup.run(["7"], field="", lazy=True, **options)[0]
+        self.assertEqual("pw", record["Password"])
+        self.assertEqual("u", record["UserName"])
+        self.assertEqual(RECORD, dict(record))
+        mock_get.assert_called_once_with(
+            mock.ANY, "http://passwordstate/api/passwords/7", params=None
+        )
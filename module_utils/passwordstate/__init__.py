@@ -0,0 +1 @@
+""" PasswordState API client shared by the passwordstate modules """
@@ -0,0 +1,232 @@
+""" PasswordState list cache """
+
+import base64
+import contextlib
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+
+from ansible.module_utils.passwordstate.client import PasswordStateException
+from ansible.module_utils.passwordstate.diskindex import MappedIndex
+from ansible.module_utils.passwordstate.diskindex import write_index
+from ansible.module_utils.passwordstate.index import PasswordIndex
+from ansible.module_utils.passwordstate.index import record_type
+
+try:
+    import fcntl
+
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+
+def cache_secret(api_key, api_username, api_password):
+    """the credentials the cache encryption key is derived from"""
+    if api_key != None:
+        return api_key
+    return api_username + "\0" + api_password
+
+
+class ListCache(object):
+    """encrypted on-disk cache of password list entries, never of passwords"""
+
+    def __init__(self, path, ttl, secret, salt):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.coalesced = 0
+        # binary index lookups, counted apart from the list lookups above
+        self.index_hits = 0
+        self.index_misses = 0
+        self._lock = threading.Lock()
+        self._key = hashlib.pbkdf2_hmac(
+            "sha256", secret.encode("utf-8"), salt.encode("utf-8"), 100000
+        )
+        self._fernet = Fernet(base64.urlsafe_b64encode(self._key))
+
+    def counters(self):
+        """the lookup counters, as reported in module results"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "coalesced": self.coalesced,
+                "index_hits": self.index_hits,
+                "index_misses": self.index_misses,
+            }
+
+    def get(self, url, password_list_id, fields):
+        """get the cached index of a list, or None if missing, expired or
+        cached without some of the given fields"""
+        data = self._load(url, password_list_id, self.ttl)
+        index = None
+        if data is not None:
+            index = ListCache._index(data)
+        with self._lock:
+            if index is None or not index.covers(fields):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return index
+
+    def get_stale(self, url, password_list_id, fields):
+        """get the cached index of a list with the validators to revalidate
+        it by, however old it is; (None, {}) if missing or without some of
+        the given fields"""
+        data = self._load(url, password_list_id, None)
+        if data is None:
+            return None, {}
+        index = ListCache._index(data)
+        if not index.covers(fields):
+            return None, {}
+        return index, data.get("validators") or {}
+
+    def set(self, url, password_list_id, index, validators=None):
+        """store the index of a list, replacing the cache file atomically
+
+        validators are the ETag, Last-Modified and content digest of the
+        list response, sent along when the list is revalidated.
+        """
+        # stored as rows of values, the column names are not repeated per entry
+        columns = [name for name in index.columns if name != "Password"]
+        data = {
+            "columns": columns,
+            "rows": [[obj.get(name) for name in columns] for obj in index.passwords],
+            "validators": validators or {},
+        }
+        token = self._fernet.encrypt(json.dumps(data).encode("utf-8"))
+        try:
+            os.makedirs(self.path, 0o700, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path)
+            try:
+                with os.fdopen(fd, "wb") as cache_file:
+                    cache_file.write(token)
+                os.replace(tmp, self._file(url, password_list_id))
+            except (IOError, OSError):
+                os.remove(tmp)
+                raise
+            index_path = self._file(url, password_list_id, ".idx")
+            try:
+                write_index(index_path, self._key, index)
+            except ValueError:
+                # an index of an older download would contradict the new list
+                if os.path.exists(index_path):
+                    os.remove(index_path)
+        except (IOError, OSError) as inst:
+            raise PasswordStateException(
+                "Failed to write the password list cache: %s" % str(inst)
+            )
+
+    def indexes(self, url, password_list_id, fields):
+        """whether a list has a fresh binary index of the given fields"""
+        index = MappedIndex.open(
+            self._file(url, password_list_id, ".idx"), self._key, self.ttl
+        )
+        if index is None:
+            return False
+        with index:
+            return index.covers(fields)
+
+    def find(self, url, password_list_id, criteria):
+        """get the PasswordIDs of the entries matching the (field, value)
+        criteria from the binary index of a list, without loading the list;
+        None if it has no fresh index of those fields"""
+        fields = [field for field, value in criteria]
+        password_ids = None
+        index = MappedIndex.open(
+            self._file(url, password_list_id, ".idx"), self._key, self.ttl
+        )
+        if index is not None:
+            with index:
+                if index.covers(fields):
+                    password_ids = index.find(criteria)
+        with self._lock:
+            if password_ids is None:
+                self.index_misses += 1
+            else:
+                self.index_hits += 1
+        return password_ids
+
+    def refresh(self, url, password_list_id, index, validators):
+        """store a list again after the server confirmed it unchanged"""
+        with self._lock:
+            self.revalidations += 1
+        self.set(url, password_list_id, index, validators)
+
+    @contextlib.contextmanager
+    def fetching(self, url, password_list_id):
+        """hold the only fetch of a list among the processes sharing the cache
+
+        Another process may have cached the list by the time the lock is
+        held, so check the cache again inside it. Without fcntl nothing is
+        locked.
+        """
+        if not HAS_FCNTL:
+            yield
+            return
+        try:
+            os.makedirs(self.path, 0o700, exist_ok=True)
+            lock = open(self._file(url, password_list_id, ".lock"), "a")
+        except (IOError, OSError) as inst:
+            raise PasswordStateException(
+                "Failed to lock the password list cache: %s" % str(inst)
+            )
+        with lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def coalesce(self, url, password_list_id, fields):
+        """get the index of a list another process cached while this one
+        was waiting for the fetch, or None"""
+        data = self._load(url, password_list_id, self.ttl)
+        if data is None:
+            return None
+        index = ListCache._index(data)
+        if not index.covers(fields):
+            return None
+        with self._lock:
+            self.coalesced += 1
+        return index
+
+    def _load(self, url, password_list_id, ttl):
+        """the decrypted cache file of a list, None if missing or too old"""
+        try:
+            with open(self._file(url, password_list_id), "rb") as cache_file:
+                token = cache_file.read()
+            data = json.loads(self._fernet.decrypt(token, ttl=ttl))
+        except (IOError, OSError, InvalidToken, ValueError, TypeError):
+            return None
+        if not isinstance(data, dict) or "rows" not in data or "columns" not in data:
+            return None
+        return data
+
+    @staticmethod
+    def _index(data):
+        """the index of a cache file's rows, decoded into compact records"""
+        cls = record_type(data["columns"])
+        return PasswordIndex([cls(*row) for row in data["rows"]], data["columns"])
+
+    def _file(self, url, password_list_id, suffix=".cache"):
+        """cache file name, unique per url, list and credentials"""
+        name = hmac.new(
+            self._key,
+            (url + "\0" + str(password_list_id)).encode("utf-8"),
+            hashlib.sha256,
+        ).hexdigest()
+        return os.path.join(self.path, name + suffix)
@@ -0,0 +1,779 @@
+""" PasswordState API client """
+
+import contextlib
+import hashlib
+import time
+from collections.abc import Mapping
+from json.decoder import JSONDecodeError
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ansible.module_utils.passwordstate.index import PasswordIndex
+from ansible.module_utils.passwordstate.index import record_type
+from ansible.module_utils.passwordstate.retry import RetryPolicy
+from ansible.module_utils.passwordstate.retry import get_bucket
+from ansible.module_utils.passwordstate.retry import never_sent
+from ansible.module_utils.passwordstate.stats import new_record
+
+try:
+    import ijson
+    from ijson import JSONError as IJSONError
+
+    HAS_IJSON = True
+except ImportError:
+    IJSONError = ValueError
+    HAS_IJSON = False
+
+
+# api credentials by url, registered by the inventory plugin so that the
+# lookups it leaves in hostvars need no credentials of their own
+CREDENTIALS = {}
+
+# the msg of new passwords that may or may not have been created
+UNKNOWN_CREATE = (
+    "Unknown: the password may have been created, verify before rerunning (%s)"
+)
+
+
+class PasswordIdException(Exception):
+    msg = "Either the password id or the match " "field id and value must be configured"
+
+
+class PasswordListIdException(PasswordIdException):
+    msg = "The password list id must be configured to match on a field"
+
+
+class PasswordStateException(Exception):
+    """an api call failed or did not resolve to exactly one password
+
+    maybe_applied is set when the server may have carried out the request
+    although it failed, like a write timing out while waiting for its answer.
+    """
+
+    def __init__(self, msg, maybe_applied=False):
+        super(PasswordStateException, self).__init__(msg)
+        self.msg = msg
+        self.maybe_applied = maybe_applied
+
+
+class Password(object):
+    """Password"""
+
+    def __init__(self, api, password_list_id, matcher, exclude_password=False):
+        self.api = api
+        self.password_list_id = password_list_id
+        self.exclude_password = exclude_password
+        self._fields = None
+        if matcher.get("id") != None:
+            self.password_id = matcher["id"]
+        elif matcher.get("field") != None and matcher.get("field_id") != None:
+            if password_list_id is None:
+                raise PasswordListIdException()
+            self.match_field = matcher["field"]
+            self.match_field_id = matcher["field_id"]
+            if matcher.get("field2") != None and matcher.get("field2_id") != None:
+                self.match_field2 = matcher["field2"]
+                self.match_field2_id = matcher["field2_id"]
+        else:
+            raise PasswordIdException()
+
+    @property
+    def fields(self):
+        """the password record, fetched from the api once and then reused"""
+        if self._fields is None:
+            self._fields = self.api.get_password_fields(self)
+        return self._fields
+
+    def refresh(self):
+        """drop the fetched password record so the next access re-reads it"""
+        self._fields = None
+
+    @property
+    def password(self):
+        """fetch the password from the api"""
+        return self.fields["Password"]
+
+    @property
+    def type(self):
+        """the method to uniquely identify the password"""
+        if hasattr(self, "password_id"):
+            return "password_id"
+        elif (hasattr(self, "match_field") and hasattr(self, "match_field_id")) or (
+            hasattr(self, "match_field2") and hasattr(self, "match_field2_id")
+        ):
+            return "match_field"
+        raise PasswordIdException()
+
+    def update(self, fields):
+        """Update the password"""
+        self.api.update(self, fields)
+
+
+class LazyRecord(Mapping):
+    """a password record whose fields are fetched when first read
+
+    Reading any field but the password fetches the record without it, the
+    password itself is only fetched when it is read. Whichever is read
+    first, each of the two is fetched at most once, and reading the
+    password before anything else costs a single fetch of the whole record.
+    """
+
+    def __init__(self, api, password_list_id, matcher):
+        self.api = api
+        self.password_list_id = password_list_id
+        self.matcher = matcher
+        self._record = None
+        self._has_password = False
+
+    def _fetch(self, exclude_password):
+        """the record, fetched with the password unless exclude_password"""
+        if self._record is not None and exclude_password:
+            return self._record
+        if self._record is not None:
+            # the password of a known record is fetched by its id
+            matcher = {"id": self._record["PasswordID"]}
+        else:
+            matcher = self.matcher
+        password = Password(self.api, self.password_list_id, matcher, exclude_password)
+        record = password.fields
+        if exclude_password:
+            record = dict(record)
+            record.pop("Password", None)
+        self._record = record
+        self._has_password = not exclude_password
+        return record
+
+    def fetch(self):
+        """the whole record with its password, fetched at once if nothing
+        was read yet"""
+        if not self._has_password:
+            self._fetch(False)
+        return dict(self._record)
+
+    def __getitem__(self, name):
+        if name == "Password" and not self._has_password:
+            return self._fetch(False)[name]
+        return self._fetch(True)[name]
+
+    def __contains__(self, name):
+        # every record has a password, so asking for it fetches nothing
+        return name == "Password" or name in self._fetch(True)
+
+    def __iter__(self):
+        for name in self._fetch(True):
+            yield name
+        if not self._has_password:
+            yield "Password"
+
+    def __len__(self):
+        return len(self._fetch(True)) + (not self._has_password)
+
+    def __repr__(self):
+        fields = dict(self._record or {})
+        if "Password" in fields:
+            fields["Password"] = UpdatePlan.MASK
+        return "LazyRecord(%r)" % fields
+
+
+class UpdatePlan(object):
+    """the single write needed to bring a password up to date"""
+
+    # shown instead of passwords in diffs
+    MASK = "********"
+
+    def __init__(self, method=None, params=None, current=None, match=()):
+        self.method = method
+        self.params = params
+        self.current = current
+        # the (field, value) pairs telling a new password apart
+        self.match = match
+
+    def diff(self):
+        """the record fields before and after the write, passwords masked"""
+        before = {}
+        after = {}
+        if self.method is None:
+            return {"before": before, "after": after}
+        for name, value in self.params.items():
+            if name in ("PasswordID", "PasswordListID"):
+                continue
+            column = "Password" if name == "password" else name
+            old = self.current.get(column) if self.current is not None else None
+            if column == "Password":
+                changed = old is not None and old != value
+                old = UpdatePlan.MASK if old is not None else None
+                value = UpdatePlan.MASK + (" (changed)" if changed else "")
+            if self.current is not None:
+                before[column] = old
+            after[column] = value
+        return {"before": before, "after": after}
+
+
+class PasswordState(object):
+    """PasswordState"""
+
+    def __init__(
+        self,
+        url,
+        api_key,
+        api_username=None,
+        api_password=None,
+        pool_size=10,
+        cache=None,
+        lookup_strategy="auto",
+        retries=3,
+        retry_backoff=1.0,
+        rate_limit=None,
+        stats=None,
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.api_username = api_username
+        self.api_password = api_password
+        self.pool_size = pool_size
+        self.cache = cache
+        self.lookup_strategy = lookup_strategy
+        self.retry_policy = RetryPolicy(retries, retry_backoff)
+        self.rate_limiter = None
+        if rate_limit:
+            self.rate_limiter = get_bucket(urlparse(url).netloc, rate_limit)
+        self.stats = stats
+        self._session = None
+        self._password_lists = {}
+
+    @property
+    def session(self):
+        """pooled keep-alive session, authenticated once for all requests"""
+        if self._session is None:
+            session = requests.Session()
+            # block instead of opening throwaway connections when every
+            # pooled one is busy, so pool_size caps the open connections
+            adapter = HTTPAdapter(pool_maxsize=self.pool_size, pool_block=True)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            if self.api_key != None:
+                session.headers["APIKey"] = self.api_key
+            else:
+                try:
+                    from requests_ntlm import HttpNtlmAuth
+                except ImportError:
+                    raise PasswordStateException(
+                        "The requests_ntlm Python library is required "
+                        "for the Windows authentication API"
+                    )
+                # NTLM authenticates the connection, so the handshake only
+                # happens when the pool opens a new one
+                session.auth = HttpNtlmAuth(self.api_username, self.api_password)
+            self._session = session
+        return self._session
+
+    def stats_result(self):
+        """the module result entries reporting the request statistics
+
+        Empty unless statistics are collected, which also writes them to
+        the statistics file if one is set.
+        """
+        if self.stats is None:
+            return {}
+        if self.stats.path:
+            self.stats.write()
+        connections = 0
+        if self._session is not None:
+            pools = self._session.get_adapter(self.url).poolmanager.pools
+            connections = sum(pools[key].num_connections for key in pools.keys())
+        return {"passwordstate_stats": self.stats.summary(self.cache, connections)}
+
+    def get_password_fields(self, password):
+        """get the password fields"""
+        if password.type == "password_id":
+            return self._get_password_by_id(
+                password.password_id, password.exclude_password
+            )
+        elif password.type == "match_field":
+            return self._get_password_by_field(password)
+
+    def plan_update(self, password, fields):
+        """resolve the password once and work out the write it needs"""
+        if password.type == "password_id":
+            password_id = password.password_id
+        elif password.type == "match_field":
+            password_ids = self._find_password_ids(password)
+            if len(password_ids) > 1:
+                raise PasswordStateException("Multiple matching passwords found")
+            if len(password_ids) == 0:
+                if not "Title" in fields:
+                    raise PasswordStateException(
+                        "Title is required when creating passwords"
+                    )
+
+                criteria = PasswordState._match_criteria(password)
+                params = dict(criteria)
+                params["PasswordListID"] = password.password_list_id
+                return UpdatePlan(
+                    "POST",
+                    PasswordState._merge_dicts(fields, params),
+                    match=tuple(criteria),
+                )
+            password_id = password_ids[0]
+
+        current = self._get_password_by_id(password_id)
+        if PasswordState._fields_match(current, fields):
+            return UpdatePlan(current=current)
+
+        params = {
+            "PasswordID": password_id,
+            "PasswordListID": password.password_list_id,
+        }
+        return UpdatePlan("PUT", PasswordState._merge_dicts(fields, params), current)
+
+    def write(self, plan):
+        """send the write of an update plan, if it has one"""
+        if plan.method is not None:
+            self._request("passwords", plan.method, plan.params)
+
+    def create_passwords(self, plans):
+        """create the passwords of several POST plans in one bulk request
+
+        Returns the (status, msg) of every plan: created, failed when the
+        server did not create it, or unknown when it may have been created
+        but the answer does not tell, so it has to be verified before the
+        task is rerun. The api answers with one entry per password, in the
+        order sent; any other answer is matched to the plans by their match
+        fields or Title.
+        """
+        try:
+            created = self._request(
+                "bulkaddpasswords", "POST", body=[plan.params for plan in plans]
+            )
+        except PasswordStateException as inst:
+            if inst.maybe_applied:
+                return [("unknown", UNKNOWN_CREATE % inst.msg)] * len(plans)
+            return [("failed", inst.msg)] * len(plans)
+        if isinstance(created, list) and len(created) == len(plans):
+            return [
+                (
+                    ("created", None)
+                    if PasswordState._is_created(entry)
+                    else ("failed", "Failed: %s" % str(entry))
+                )
+                for entry in created
+            ]
+        return PasswordState._match_created(plans, created)
+
+    @staticmethod
+    def _is_created(entry):
+        """whether a bulk answer entry is a created password"""
+        return isinstance(entry, dict) and entry.get("PasswordID") != None
+
+    @staticmethod
+    def _match_created(plans, created):
+        """the (status, msg) of every plan, found among the created entries
+
+        A plan is created when exactly one entry has its match fields, or
+        its Title if the entries lack those, and no other plan claims it.
+        """
+        entries = []
+        if isinstance(created, list):
+            entries = [entry for entry in created if PasswordState._is_created(entry)]
+        found = []
+        for plan in plans:
+            pairs = plan.match
+            if not pairs or any(
+                field not in entry for entry in entries for field, value in pairs
+            ):
+                pairs = (("Title", plan.params.get("Title")),)
+            found.append(
+                [
+                    n
+                    for n, entry in enumerate(entries)
+                    if all(
+                        str(entry.get(field)) == str(value) for field, value in pairs
+                    )
+                ]
+            )
+        claims = {}
+        for matches in found:
+            for n in matches:
+                claims[n] = claims.get(n, 0) + 1
+        msg = UNKNOWN_CREATE % "unexpected bulk answer"
+        return [
+            (
+                ("created", None)
+                if len(matches) == 1 and claims[matches[0]] == 1
+                else ("unknown", msg)
+            )
+            for matches in found
+        ]
+
+    def download_lists(self, passwords, executor):
+        """download the password lists that several of the passwords share
+
+        Every list is downloaded with the lookup strategy list, none with
+        search, single passwords are left to the lookup strategy otherwise.
+        Returns the error message of every list that failed to download.
+        """
+        list_usage = {}
+        list_fields = {}
+        for password in passwords:
+            if password is not None and password.type == "match_field":
+                list_id = password.password_list_id
+                list_usage[list_id] = list_usage.get(list_id, 0) + 1
+                list_fields.setdefault(list_id, set()).update(
+                    field for field, value in PasswordState._match_criteria(password)
+                )
+        if self.lookup_strategy == "search":
+            list_ids = []
+        elif self.lookup_strategy == "list":
+            list_ids = sorted(list_usage)
+        else:
+            list_ids = sorted(k for k, v in list_usage.items() if v > 1)
+        list_errors = {}
+
+        def download(list_id):
+            if self._use_index(list_id) and self.cache.indexes(
+                self.url, list_id, list_fields[list_id]
+            ):
+                # the lookups are answered by the list's binary index instead
+                return
+            try:
+                self._get_password_list(list_id, list_fields[list_id])
+            except PasswordStateException as inst:
+                list_errors[list_id] = inst.msg
+
+        list(executor.map(download, list_ids))
+        return list_errors
+
+    def _get_password_by_id(self, password_id, exclude_password=False):
+        """get the password by the password id, without the password itself
+        if exclude_password is set"""
+        params = None
+        if exclude_password:
+            params = {"ExcludePassword": "true"}
+        passwords = self._request("passwords/" + str(password_id), "GET", params)
+        if len(passwords) == 0:
+            raise PasswordStateException("Password not found")
+        if len(passwords) > 1:
+            raise PasswordStateException("Multiple matching passwords found")
+        return passwords[0]
+
+    def _get_password_by_field(self, password):
+        """get the password by a specific field"""
+        return self._get_password_by_id(
+            self._get_password_id(password), password.exclude_password
+        )
+
+    def _get_password_id(self, password):
+        """get the password id by using a specific field"""
+        password_ids = self._find_password_ids(password)
+        if len(password_ids) == 0:
+            raise PasswordStateException("Password not found")
+        elif len(password_ids) > 1:
+            raise PasswordStateException("Multiple matching passwords found")
+
+        return password_ids[0]
+
+    def _use_index(self, password_list_id):
+        """whether lookups in a list try its binary index first: with a cache,
+        unless searching or the list is loaded already"""
+        return (
+            self.cache is not None
+            and self.lookup_strategy != "search"
+            and password_list_id not in self._password_lists
+        )
+
+    def _find_password_ids(self, password):
+        """get the ids of the entries matching the password's match fields,
+        from the binary index of the cached list if there is one"""
+        criteria = PasswordState._match_criteria(password)
+        if self._use_index(password.password_list_id):
+            # a cached list's binary index answers without loading the list
+            password_ids = self.cache.find(
+                self.url, password.password_list_id, criteria
+            )
+            if password_ids is not None:
+                return password_ids
+        return [obj["PasswordID"] for obj in self._find_passwords(password)]
+
+    def _find_passwords(self, password):
+        """get the list entries matching the password's match fields"""
+        criteria = PasswordState._match_criteria(password)
+        fields = [field for field, value in criteria]
+        if self.lookup_strategy == "list" or (
+            self.lookup_strategy == "auto"
+            and self._get_known_password_list(password.password_list_id, fields)
+            is not None
+        ):
+            index = self._get_password_list(password.password_list_id, fields)
+        else:
+            index = self._search_passwords(password.password_list_id, criteria)
+        return index.find(*[item for pair in criteria for item in pair])
+
+    def _get_password_list(self, password_list_id, fields):
+        """download and index a password list once for all later lookups
+
+        Only the given fields and the PasswordID of each entry are kept.
+        """
+        index = self._get_known_password_list(password_list_id, fields)
+        if index is None:
+            columns = set(fields) | set(["PasswordID"])
+            known = self._password_lists.get(password_list_id)
+            if known is not None and known.columns is not None:
+                columns |= set(known.columns)
+            columns = sorted(columns)
+            uri = "passwords/" + password_list_id + "?QueryAll&ExcludePassword=true"
+            if self.cache is None:
+                index = PasswordIndex(self._request_list(uri, columns), columns)
+            else:
+                index = self._fetch_cached_list(uri, password_list_id, fields, columns)
+            self._password_lists[password_list_id] = index
+        return index
+
+    def _fetch_cached_list(self, uri, password_list_id, fields, columns):
+        """fetch a list into the cache, once for all processes sharing it
+
+        Processes asking for the same list at the same time, like the forks
+        of one task, wait for the first one and then read its cached list.
+        """
+        with self.cache.fetching(self.url, password_list_id):
+            # the cache missed before the lock, another process may have
+            # filled it since, whether or not this one had to wait
+            index = self.cache.coalesce(self.url, password_list_id, fields)
+            if index is not None:
+                return index
+            # an expired cached list is revalidated instead of dropped
+            stale, validators = self.cache.get_stale(
+                self.url, password_list_id, columns
+            )
+            passwords = self._request_list(uri, columns, validators)
+            if passwords is None:
+                index = stale
+                self.cache.refresh(self.url, password_list_id, index, validators)
+            else:
+                index = PasswordIndex(passwords, columns)
+                self.cache.set(self.url, password_list_id, index, validators)
+            return index
+
+    def _get_known_password_list(self, password_list_id, fields):
+        """get a password list already downloaded in this run or cached"""
+        index = self._password_lists.get(password_list_id)
+        if index is not None and index.covers(fields):
+            return index
+        if self.cache is not None:
+            index = self.cache.get(self.url, password_list_id, fields)
+            if index is not None:
+                self._password_lists[password_list_id] = index
+                return index
+        return None
+
+    def _search_passwords(self, password_list_id, criteria):
+        """let the server search the list for the given field values"""
+        params = dict(criteria)
+        params["ExcludePassword"] = "true"
+        passwords = self._request("searchpasswords/" + password_list_id, "GET", params)
+        # the search may match loosely, the index keeps exact matches only
+        return PasswordIndex(passwords)
+
+    @staticmethod
+    def _match_criteria(password):
+        """the (field, value) pairs a password is matched on"""
+        criteria = []
+        if hasattr(password, "match_field") and hasattr(password, "match_field_id"):
+            criteria.append((password.match_field, password.match_field_id))
+        if hasattr(password, "match_field2") and hasattr(password, "match_field2_id"):
+            criteria.append((password.match_field2, password.match_field2_id))
+        return criteria
+
+    @staticmethod
+    def _fields_match(current, fields):
+        """checks if the password record already has the requested fields"""
+        if "password" in fields and current["Password"] != fields["password"]:
+            return False
+        if "Title" in fields and current["Title"] != fields["Title"]:
+            return False
+        if "UserName" in fields and current["UserName"] != fields["UserName"]:
+            return False
+        return True
+
+    def _request(self, uri, method, params=None, body=None):
+        """send a request to the api and return as json"""
+        with self._recording(method, uri) as record:
+            response = self._send(uri, method, params, record=record, body=body)
+            started = time.monotonic()
+            try:
+                value = response.json()
+            except JSONDecodeError as inst:
+                raise PasswordStateException(
+                    "Failed: %s" % str(inst), maybe_applied=True
+                )
+            if self.stats is not None:
+                record["transfer"] = time.monotonic() - started
+                record["bytes"] = len(response.content)
+            return value
+
+    def _request_list(self, uri, columns, validators=None):
+        """get a list of passwords as compact records of the given columns
+
+        With ijson installed the entries are decoded while the response
+        streams in, so the full list is never held in memory.
+
+        Given the validators of a cached copy of the list, the request is
+        conditional and None is returned when the server answers 304 or
+        the content digest shows the list unchanged. validators is updated
+        with those of the response.
+        """
+        headers = {}
+        decode = record_type(columns).decode
+        if validators:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        with self._recording("GET", uri) as record:
+            response = self._send(
+                uri, "GET", stream=True, record=record, headers=headers
+            )
+            if response.status_code == 304:
+                response.close()
+                return None
+            started = time.monotonic()
+            digest = hashlib.sha256() if validators is not None else None
+            try:
+                if not HAS_IJSON:
+                    if digest is not None:
+                        digest.update(response.content)
+                    passwords = [decode(obj) for obj in response.json()]
+                    if self.stats is not None:
+                        record["bytes"] = len(response.content)
+                else:
+                    passwords = []
+                    entries = ijson.sendable_list()
+                    decoder = ijson.items_coro(entries, "item", use_float=True)
+                    for chunk in response.iter_content(65536):
+                        record["bytes"] += len(chunk)
+                        if digest is not None:
+                            digest.update(chunk)
+                        decoder.send(chunk)
+                        passwords.extend(decode(obj) for obj in entries)
+                        del entries[:]
+                    decoder.close()
+                    passwords.extend(decode(obj) for obj in entries)
+            except (
+                requests.exceptions.RequestException,
+                ValueError,
+                IJSONError,
+            ) as inst:
+                raise PasswordStateException("Failed: %s" % str(inst))
+            finally:
+                response.close()
+            record["transfer"] = time.monotonic() - started
+            if validators is None:
+                return passwords
+            unchanged = validators.get("digest") == digest.hexdigest()
+            validators.clear()
+            validators.update(
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                digest=digest.hexdigest(),
+            )
+            return None if unchanged else passwords
+
+    @contextlib.contextmanager
+    def _recording(self, method, uri):
+        """collect the statistics of one request when they are enabled"""
+        record = new_record(method, uri)
+        try:
+            yield record
+        except PasswordStateException as inst:
+            if self.stats is not None:
+                self.stats.finish(record, inst.msg)
+            raise
+        if self.stats is not None:
+            self.stats.finish(record)
+
+    def _send(
+        self,
+        uri,
+        method,
+        params=None,
+        stream=False,
+        record=None,
+        headers=None,
+        body=None,
+    ):
+        """send a request to the api and return the successful response
+
+        Dropped connections and busy server answers are retried as far as
+        the retry policy allows, every try waits for the rate limiter first.
+        A conditional request (with headers) also succeeds with a 304.
+        """
+        request_methods = {
+            "GET": self.session.get,
+            "PUT": self.session.put,
+            "POST": self.session.post,
+        }
+
+        if self.api_key != None:
+            full_uri = self.url + "/api/" + uri
+        else:
+            full_uri = self.url + "/winapi/" + uri
+
+        if record is None:
+            record = new_record(method, uri)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            record["attempts"] += 1
+            try:
+                kwargs = {"params": params}
+                if stream:
+                    kwargs["stream"] = True
+                if headers:
+                    kwargs["headers"] = headers
+                if body is not None:
+                    kwargs["json"] = body
+                response = request_methods[method](full_uri, **kwargs)
+            except requests.exceptions.RequestException as inst:
+                if not self.retry_policy.retry_error(method, inst, attempt):
+                    raise PasswordStateException(
+                        "Failed: %s" % str(inst), maybe_applied=not never_sent(inst)
+                    )
+                time.sleep(self.retry_policy.delay(attempt))
+                attempt += 1
+                continue
+
+            if self.stats is not None:
+                record["status"] = response.status_code
+                record["server"] += response.elapsed.total_seconds()
+            if response.status_code == 304 and headers:
+                return response
+            if response.status_code > 204:
+                if self.retry_policy.retry_response(method, response, attempt):
+                    response.close()
+                    time.sleep(self.retry_policy.delay(attempt, response))
+                    attempt += 1
+                    continue
+                # a server error may come after the request was carried out
+                raise PasswordStateException(
+                    "Failed: %s" % PasswordState._error_body(response),
+                    maybe_applied=response.status_code >= 500,
+                )
+
+            return response
+
+    @staticmethod
+    def _error_body(response):
+        """the error the api answered with, json or, from a proxy, plain text"""
+        try:
+            return str(response.json())
+        except ValueError:
+            return "HTTP %d %s" % (response.status_code, response.text[:200])
+
+    @staticmethod
+    def _merge_dicts(xray, yankee):
+        """merge two dicts"""
+        zulu = xray.copy()
+        zulu.update(yankee)
+        return zulu
@@ -0,0 +1,173 @@
+""" PasswordState binary list index """
+
+import hmac
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+# magic, version, field count, creation time, slot count, id count
+HEADER = struct.Struct("<4sHHdII")
+# hash of a (field, value) pair, offset and length of its PasswordIDs
+SLOT = struct.Struct("<QII")
+MAGIC = b"PSIX"
+VERSION = 1
+
+
+def key_hash(key, field, value):
+    """the keyed hash of a (field, value) pair, never 0 which marks empty slots"""
+    digest = hmac.digest(
+        key, (field + "\0" + json.dumps(value)).encode("utf-8"), "sha256"
+    )
+    return int.from_bytes(digest[:8], "little") or 1
+
+
+def _aligned(size):
+    """size rounded up to the 8 bytes PasswordIDs are aligned to"""
+    return (size + 7) & ~7
+
+
+def write_index(path, key, index):
+    """write the binary index of a password list index, replacing path
+
+    Every (field, value) pair of the entries maps to the PasswordIDs having
+    it, by a hash keyed with key so that the file holds no field values.
+    Lists whose PasswordIDs are not integers get no index.
+    """
+    fields = [name for name in index.columns if name not in ("PasswordID", "Password")]
+    postings = {}
+    for obj in index.passwords:
+        password_id = obj["PasswordID"]
+        if not isinstance(password_id, int) or isinstance(password_id, bool):
+            raise ValueError("PasswordID %r is not an integer" % (password_id,))
+        for field in fields:
+            postings.setdefault(key_hash(key, field, obj.get(field)), []).append(
+                password_id
+            )
+
+    # at most three quarters full, so that probes stay short
+    slots = 8
+    while slots * 3 < len(postings) * 4:
+        slots *= 2
+    table = [(0, 0, 0)] * slots
+    ids = []
+    for hashed, password_ids in postings.items():
+        slot = hashed & (slots - 1)
+        while table[slot][0]:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = (hashed, len(ids), len(password_ids))
+        ids.extend(password_ids)
+
+    names = b"".join(
+        struct.pack("<H", len(name)) + name
+        for name in [field.encode("utf-8") for field in fields]
+    )
+    head = HEADER.pack(MAGIC, VERSION, len(fields), time.time(), slots, len(ids))
+    head += names
+    data = [head, b"\0" * (_aligned(len(head)) - len(head))]
+    data.extend(SLOT.pack(*slot) for slot in table)
+    # native order, as the mapped ids are read by memoryview.cast
+    data.append(struct.pack("=%dq" % len(ids), *ids))
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as index_file:
+            index_file.write(b"".join(data))
+        os.replace(tmp, path)
+    except (IOError, OSError):
+        os.remove(tmp)
+        raise
+
+
+class MappedIndex(object):
+    """a binary list index read straight from the mapped file
+
+    Opening one reads only the header, lookups probe the hash table and
+    slice the PasswordIDs out of the mapping without decoding the list.
+    """
+
+    def __init__(self, mapping, key):
+        self._mapping = mapping
+        self._key = key
+        magic, version, nfields, self.created, self._slots, nids = HEADER.unpack_from(
+            mapping
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a password list index")
+        offset = HEADER.size
+        self.fields = set()
+        for _ in range(nfields):
+            (size,) = struct.unpack_from("<H", mapping, offset)
+            self.fields.add(
+                bytes(mapping[offset + 2 : offset + 2 + size]).decode("utf-8")
+            )
+            offset += 2 + size
+        self._table = _aligned(offset)
+        start = self._table + self._slots * SLOT.size
+        if len(mapping) != start + nids * 8:
+            raise ValueError("truncated password list index")
+        self._view = memoryview(mapping)
+        self._ids = self._view[start:].cast("q")
+
+    @classmethod
+    def open(cls, path, key, ttl):
+        """the index at path, or None if missing, unreadable or older than ttl"""
+        try:
+            with open(path, "rb") as index_file:
+                mapping = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            index = cls(mapping, key)
+        except (ValueError, struct.error):
+            mapping.close()
+            return None
+        if time.time() - index.created > ttl:
+            index.close()
+            return None
+        return index
+
+    def covers(self, fields):
+        """whether the given fields were indexed"""
+        return set(fields) <= self.fields
+
+    def lookup(self, field, value):
+        """the PasswordIDs of the entries whose field has the given value"""
+        hashed = key_hash(self._key, field, value)
+        slot = hashed & (self._slots - 1)
+        while True:
+            stored, offset, count = SLOT.unpack_from(
+                self._mapping, self._table + slot * SLOT.size
+            )
+            if stored == hashed:
+                return self._ids[offset : offset + count]
+            if stored == 0:
+                return self._ids[0:0]
+            slot = (slot + 1) & (self._slots - 1)
+
+    def find(self, criteria):
+        """the PasswordIDs of the entries matching every (field, value) pair"""
+        found = None
+        for field, value in criteria:
+            with self.lookup(field, value) as password_ids:
+                if found is None:
+                    found = password_ids.tolist()
+                else:
+                    matching = set(password_ids.tolist())
+                    found = [
+                        password_id for password_id in found if password_id in matching
+                    ]
+        return found or []
+
+    def close(self):
+        self._ids.release()
+        self._view.release()
+        self._mapping.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
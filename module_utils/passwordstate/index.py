@@ -0,0 +1,95 @@
+""" PasswordState list index """
+
+from collections.abc import Mapping
+
+# the record class of every column set, so equal lists share one class
+_RECORD_TYPES = {}
+
+
+class Record(Mapping):
+    """a list entry keeping only some columns, in slots instead of a dict
+
+    Subclasses made by record_type hold one column per slot, which takes a
+    fraction of the memory of a dict per entry. Records read like the dicts
+    the api returns, and compare equal to them.
+    """
+
+    __slots__ = ()
+    columns = ()
+    _slots = {}
+
+    def __init__(self, *values):
+        for slot, value in zip(self.__slots__, values):
+            setattr(self, slot, value)
+
+    @classmethod
+    def decode(cls, obj):
+        """the record of a decoded list entry, dropping the other columns"""
+        return cls(*[obj.get(name) for name in cls.columns])
+
+    def values_list(self):
+        """the values in the order of the columns"""
+        return [getattr(self, slot) for slot in self.__slots__]
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, self._slots[name])
+        except KeyError:
+            raise KeyError(name)
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+def record_type(columns):
+    """the record class holding the given columns"""
+    columns = tuple(columns)
+    cls = _RECORD_TYPES.get(columns)
+    if cls is None:
+        # columns are api field names, not necessarily identifiers
+        slots = tuple("_%d" % i for i in range(len(columns)))
+        cls = type(
+            "Record",
+            (Record,),
+            {
+                "__slots__": slots,
+                "columns": columns,
+                "_slots": dict(zip(columns, slots)),
+            },
+        )
+        cls = _RECORD_TYPES.setdefault(columns, cls)
+    return cls
+
+
+class PasswordIndex(object):
+    """password list entries indexed by the fields they are matched on"""
+
+    def __init__(self, passwords, columns=None):
+        self.passwords = passwords
+        self.columns = columns
+        self._indexes = {}
+
+    def covers(self, fields):
+        """whether the entries kept all of the given fields"""
+        return self.columns is None or set(fields) <= set(self.columns)
+
+    def find(self, field, value, field2=None, value2=None):
+        """get the entries whose field (and field2) have the given values"""
+        if field2 is None:
+            fields, values = (field,), (value,)
+        else:
+            fields, values = (field, field2), (value, value2)
+        if fields not in self._indexes:
+            # one pass over the list per field combination, dict hits after that
+            index = {}
+            for obj in self.passwords:
+                key = tuple(obj.get(name) for name in fields)
+                index.setdefault(key, []).append(obj)
+            self._indexes[fields] = index
+        return self._indexes[fields].get(values, [])
@@ -0,0 +1,121 @@
+""" Retry policy and rate limiter for the PasswordState API """
+
+import email.utils
+import random
+import threading
+import time
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+# statuses a busy or restarting server answers with before handling a request
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+# the token bucket of every host, shared by all clients in this process
+_BUCKETS = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def never_sent(error):
+    """whether a request error certainly happened before the request was sent:
+    a connect that timed out or was refused"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or not error.args:
+        return False
+    # requests wraps urllib3's MaxRetryError, whose reason is the failed connect
+    cause = getattr(error.args[0], "reason", error.args[0])
+    return isinstance(cause, NewConnectionError)
+
+
+class RetryPolicy(object):
+    """decides which failed requests are retried and how long to wait
+
+    GET and PUT are idempotent and retried on any connection error or busy
+    server status. A POST creates a password, so it is only retried when it
+    certainly never reached the server: a connect that timed out or was
+    refused, or a 429.
+    """
+
+    def __init__(self, retries=3, backoff=1.0, max_backoff=60.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def retry_error(self, method, error, attempt):
+        """whether a request that raised error is tried again"""
+        if attempt >= self.retries:
+            return False
+        if method == "POST":
+            return never_sent(error)
+        return isinstance(
+            error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        )
+
+    def retry_response(self, method, response, attempt):
+        """whether a request answered with response is tried again"""
+        if attempt >= self.retries:
+            return False
+        if method == "POST":
+            return response.status_code == 429
+        return response.status_code in RETRY_STATUSES
+
+    def delay(self, attempt, response=None):
+        """seconds to wait before the next try
+
+        The server's Retry-After wins, otherwise the exponential backoff
+        is jittered over its full range so parallel workers spread out.
+        """
+        retry_after = None
+        if response is not None:
+            retry_after = RetryPolicy._retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    @staticmethod
+    def _retry_after(value):
+        """the seconds of a Retry-After header, given as seconds or a date"""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        date = email.utils.parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0.0, email.utils.mktime_tz(date) - time.time())
+
+
+class TokenBucket(object):
+    """lets at most rate requests per second through, in bursts up to rate"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.capacity = max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """take a token, waiting until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # reserve the token now so concurrent callers queue up behind it
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def get_bucket(host, rate):
+    """get the process-wide token bucket for a host"""
+    with _BUCKETS_LOCK:
+        if (host, rate) not in _BUCKETS:
+            _BUCKETS[(host, rate)] = TokenBucket(rate)
+        return _BUCKETS[(host, rate)]
@@ -0,0 +1,94 @@
+""" Request statistics of the PasswordState API client """
+
+import json
+import threading
+import time
+
+
+def endpoint(method, uri):
+    """the endpoint of a request, with ids and query values left out"""
+    path, _, query = uri.partition("?")
+    parts = path.split("/")
+    name = "/".join(parts[:1] + ["{id}"] * (len(parts) - 1))
+    if query:
+        name += "?" + "&".join(param.split("=")[0] for param in query.split("&"))
+    return method + " " + name
+
+
+def new_record(method, uri):
+    """a record for a request about to be sent"""
+    return {
+        "endpoint": endpoint(method, uri),
+        "status": None,
+        "attempts": 0,
+        "server": 0.0,
+        "transfer": 0.0,
+        "bytes": 0,
+        "error": None,
+        "time": time.time(),
+        "_started": time.monotonic(),
+    }
+
+
+class RequestStats(object):
+    """timings, counts and sizes of the requests a client sends
+
+    Every finished request record is kept, summed up per endpoint by summary
+    and appended as JSON lines to path by write.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.records = []
+        self._lock = threading.Lock()
+
+    def finish(self, record, error=None):
+        """complete a record once its response is read or it failed"""
+        record["total"] = time.monotonic() - record.pop("_started")
+        record["error"] = error
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self, cache=None, connections=None):
+        """the totals of all requests and of each endpoint"""
+        endpoints = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            totals = endpoints.setdefault(
+                record["endpoint"],
+                {
+                    "requests": 0,
+                    "errors": 0,
+                    "retries": 0,
+                    "total": 0.0,
+                    "server": 0.0,
+                    "transfer": 0.0,
+                    "bytes": 0,
+                },
+            )
+            totals["requests"] += 1
+            totals["errors"] += record["error"] is not None
+            totals["retries"] += max(0, record["attempts"] - 1)
+            for key in ("total", "server", "transfer", "bytes"):
+                totals[key] += record[key]
+
+        summary = {
+            "requests": len(records),
+            "errors": sum(totals["errors"] for totals in endpoints.values()),
+            "retries": sum(totals["retries"] for totals in endpoints.values()),
+            "bytes": sum(totals["bytes"] for totals in endpoints.values()),
+            "endpoints": endpoints,
+            "connections_opened": connections,
+        }
+        if cache is not None:
+            summary["cache"] = cache.counters()
+        return summary
+
+    def write(self):
+        """append every record as a JSON line to the stats file"""
+        with self._lock:
+            records = list(self.records)
+        with open(self.path, "a") as stats_file:
+            for record in records:
+                stats_file.write(json.dumps(record, sort_keys=True) + "\n")
@@ -0,0 +1,603 @@
+""" PasswordState Test """
+
+import concurrent.futures
+import functools
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from ansible.module_utils.passwordstate.cache import ListCache
+from ansible.module_utils.passwordstate.client import Password
+from ansible.module_utils.passwordstate.client import PasswordState
+from ansible.module_utils.passwordstate.client import PasswordStateException
+from ansible.module_utils.passwordstate.index import PasswordIndex
+from ansible.module_utils.passwordstate.index import record_type
+from ansible.module_utils.passwordstate.retry import RetryPolicy
+from ansible.module_utils.passwordstate.retry import TokenBucket
+from ansible.module_utils.passwordstate.stats import RequestStats
+from ansible.module_utils.passwordstate.stats import endpoint
+from testhelpers import make_response
+import mock
+import requests
+from urllib3.exceptions import MaxRetryError
+from urllib3.exceptions import NewConnectionError
+from urllib3.exceptions import ProtocolError
+
+
+class PasswordIndexTest(unittest.TestCase):
+    """PasswordIndexTest"""
+
+    passwords = [
+        {"PasswordID": 1, "GenericField1": "alpha", "GenericField2": "beta"},
+        {"PasswordID": 2, "GenericField1": "alpha", "GenericField2": "delta"},
+        {"PasswordID": 3, "GenericField1": "echo", "GenericField2": "beta"},
+    ]
+
+    def test_find_field(self):
+        """entries are found by a single field, duplicates included"""
+        index = PasswordIndex(self.passwords)
+        self.assertEqual(
+            [1, 2], [p["PasswordID"] for p in index.find("GenericField1", "alpha")]
+        )
+        self.assertEqual([], index.find("GenericField1", "foxtrot"))
+
+    def test_find_fields(self):
+        """entries are found by a pair of fields"""
+        index = PasswordIndex(self.passwords)
+        found = index.find("GenericField1", "alpha", "GenericField2", "delta")
+        self.assertEqual([2], [p["PasswordID"] for p in found])
+
+    def test_find_builds_once(self):
+        """the list is scanned once per field combination"""
+        passwords = mock.MagicMock()
+        passwords.__iter__.return_value = iter(self.passwords)
+        index = PasswordIndex(passwords)
+        index.find("GenericField1", "alpha")
+        index.find("GenericField1", "echo")
+        self.assertEqual(1, passwords.__iter__.call_count)
+
+
+class RecordTest(unittest.TestCase):
+    """RecordTest"""
+
+    def test_decode(self):
+        """records keep only their columns and read like dicts"""
+        cls = record_type(["GenericField1", "PasswordID"])
+        record = cls.decode({"PasswordID": 1, "GenericField1": "a", "Notes": "x"})
+
+        self.assertEqual({"GenericField1": "a", "PasswordID": 1}, record)
+        self.assertEqual(1, record["PasswordID"])
+        self.assertIsNone(record.get("Notes"))
+        self.assertEqual(["a", 1], record.values_list())
+        self.assertFalse(hasattr(record, "__dict__"))
+        with self.assertRaises(KeyError):
+            record["Notes"]
+
+    def test_record_type_shared(self):
+        """one class per column set, also for columns that are no identifiers"""
+        cls = record_type(["Field With Space", "PasswordID"])
+
+        self.assertIs(cls, record_type(("Field With Space", "PasswordID")))
+        self.assertEqual({"Field With Space": "v", "PasswordID": 2}, cls("v", 2))
+
+
+class RequestListTest(unittest.TestCase):
+    """RequestListTest"""
+
+    passwords = [
+        {"PasswordID": 1, "Title": "a", "Notes": "x" * 100, "GenericField1": "g"},
+        {"PasswordID": 2, "Title": "b", "Notes": "y" * 100, "GenericField1": "h"},
+    ]
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_request_list(self, mock_get):
+        """list entries keep only the requested columns"""
+        mock_get.return_value = make_response(self.passwords)
+        api = PasswordState("http://passwordstate", "abc")
+
+        passwords = api._request_list("passwords/1", ["PasswordID", "Title"])
+
+        self.assertEqual(
+            [{"PasswordID": 1, "Title": "a"}, {"PasswordID": 2, "Title": "b"}],
+            passwords,
+        )
+        mock_get.assert_called_once_with(
+            api.session,
+            "http://passwordstate/api/passwords/1",
+            params=None,
+            stream=True,
+        )
+
+    @mock.patch("ansible.module_utils.passwordstate.client.HAS_IJSON", False)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_request_list_without_ijson(self, mock_get):
+        """list entries are projected after decoding without ijson"""
+        mock_get.return_value = make_response(self.passwords)
+        api = PasswordState("http://passwordstate", "abc")
+
+        passwords = api._request_list("passwords/1", ["PasswordID"])
+
+        self.assertEqual([{"PasswordID": 1}, {"PasswordID": 2}], passwords)
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_request_list_invalid(self, mock_get):
+        """an invalid list response fails the request"""
+        response = make_response(None)
+        response.raw = io.BytesIO(b'[{"PasswordID": 1}, {"Pass')
+        mock_get.return_value = response
+        api = PasswordState("http://passwordstate", "abc")
+
+        with self.assertRaises(PasswordStateException):
+            api._request_list("passwords/1", ["PasswordID"])
+
+
+class ListCacheTest(unittest.TestCase):
+    """ListCacheTest"""
+
+    passwords = [{"PasswordID": 1, "GenericField1": "alpha", "Password": "secret"}]
+    columns = ["GenericField1", "PasswordID"]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.index = PasswordIndex(self.passwords, self.columns)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_roundtrip(self):
+        """cached entries are encrypted and stored without passwords"""
+        cache = ListCache(self.path, 300, "abc123xyz", "http://passwordstate")
+        self.assertIsNone(cache.get("http://passwordstate", "123", []))
+        cache.set("http://passwordstate", "123", self.index)
+
+        index = cache.get("http://passwordstate", "123", ["GenericField1"])
+        self.assertEqual([{"PasswordID": 1, "GenericField1": "alpha"}], index.passwords)
+        self.assertEqual(self.columns, index.columns)
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        for name in os.listdir(self.path):
+            with open(os.path.join(self.path, name), "rb") as cache_file:
+                self.assertNotIn(b"alpha", cache_file.read())
+
+    def test_unwritable(self):
+        """a cache path that cannot be written fails with an api error"""
+        path = os.path.join(self.path, "file")
+        open(path, "w").close()
+        cache = ListCache(path, 300, "abc123xyz", "http://passwordstate")
+
+        with self.assertRaises(PasswordStateException) as context:
+            cache.set("http://passwordstate", "123", self.index)
+        self.assertIn("Failed to write the password list cache", context.exception.msg)
+        with self.assertRaises(PasswordStateException) as context:
+            with cache.fetching("http://passwordstate", "123"):
+                pass
+        self.assertIn("Failed to lock the password list cache", context.exception.msg)
+
+    def test_missing_columns(self):
+        """entries cached without a needed field are a miss"""
+        cache = ListCache(self.path, 300, "abc123xyz", "http://passwordstate")
+        cache.set("http://passwordstate", "123", self.index)
+        self.assertIsNone(cache.get("http://passwordstate", "123", ["Title"]))
+        self.assertEqual((0, 1), (cache.hits, cache.misses))
+
+    def test_expired(self):
+        """entries older than the ttl are a miss"""
+        cache = ListCache(self.path, -1, "abc123xyz", "http://passwordstate")
+        cache.set("http://passwordstate", "123", self.index)
+        self.assertIsNone(cache.get("http://passwordstate", "123", []))
+
+    def test_other_credentials(self):
+        """entries cached with other credentials are a miss"""
+        cache = ListCache(self.path, 300, "abc123xyz", "http://passwordstate")
+        cache.set("http://passwordstate", "123", self.index)
+        other = ListCache(self.path, 300, "xyz", "http://passwordstate")
+        self.assertIsNone(other.get("http://passwordstate", "123", []))
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_cache_hit_skips_list_download(self, mock_get):
+        """a cached list resolves match fields without a list request"""
+        cache = ListCache(self.path, 300, "abc123xyz", "http://passwordstate")
+        cache.set("http://passwordstate", "123", self.index)
+        mock_get.return_value = make_response([{"Password": "secret"}])
+
+        api = PasswordState("http://passwordstate", "abc123xyz", cache=cache)
+        password = Password(
+            api,
+            "123",
+            {
+                "id": None,
+                "field": "GenericField1",
+                "field_id": "alpha",
+                "field2": None,
+                "field2_id": None,
+            },
+        )
+
+        self.assertEqual("secret", password.password)
+        mock_get.assert_called_once_with(
+            api.session, "http://passwordstate/api/passwords/1", params=None
+        )
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_single_flight(self, mock_get):
+        """a list another process is fetching is read from the cache after"""
+        holder = ListCache(self.path, 300, "abc123xyz", "http://passwordstate")
+        cache = ListCache(self.path, 300, "abc123xyz", "http://passwordstate")
+        api = PasswordState("http://passwordstate", "abc123xyz", cache=cache)
+        result = []
+        waiter = threading.Thread(
+            target=lambda: result.append(
+                api._get_password_list("123", ["GenericField1"])
+            )
+        )
+
+        with holder.fetching("http://passwordstate", "123"):
+            waiter.start()
+            waiter.join(0.2)
+            self.assertTrue(waiter.is_alive())
+            holder.set("http://passwordstate", "123", self.index)
+        waiter.join()
+
+        self.assertEqual(
+            [{"PasswordID": 1, "GenericField1": "alpha"}], result[0].passwords
+        )
+        self.assertEqual((0, 1, 1), (cache.hits, cache.misses, cache.coalesced))
+        mock_get.assert_not_called()
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_single_flight_after_release(self, mock_get):
+        """a list cached after the early check is read once the lock is held"""
+        cache = ListCache(self.path, 300, "abc123xyz", "http://passwordstate")
+        api = PasswordState("http://passwordstate", "abc123xyz", cache=cache)
+        # another process fetched the list between this one's check and lock
+        with mock.patch.object(cache, "get", return_value=None):
+            cache.set("http://passwordstate", "123", self.index)
+            index = api._get_password_list("123", ["GenericField1"])
+
+        self.assertEqual([{"PasswordID": 1, "GenericField1": "alpha"}], index.passwords)
+        self.assertEqual(1, cache.coalesced)
+        mock_get.assert_not_called()
+
+
+class MappedIndexTest(unittest.TestCase):
+    """MappedIndexTest"""
+
+    passwords = [
+        {"PasswordID": 1, "GenericField1": "alpha", "UserName": "root"},
+        {"PasswordID": 2, "GenericField1": "beta", "UserName": "root"},
+        {"PasswordID": 3, "GenericField1": "beta", "UserName": "app"},
+    ]
+    columns = ["GenericField1", "PasswordID", "UserName"]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = ListCache(self.path, 300, "abc123xyz", "http://passwordstate")
+        self.cache.set(
+            "http://passwordstate", "123", PasswordIndex(self.passwords, self.columns)
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_find(self):
+        """the index answers one and two field matches"""
+        find = functools.partial(self.cache.find, "http://passwordstate", "123")
+        self.assertEqual([1], find([("GenericField1", "alpha")]))
+        self.assertEqual([1, 2], find([("UserName", "root")]))
+        self.assertEqual([2], find([("GenericField1", "beta"), ("UserName", "root")]))
+        self.assertEqual([], find([("GenericField1", "gamma")]))
+        self.assertEqual([], find([("GenericField1", "alpha"), ("UserName", "app")]))
+        self.assertIsNone(find([("Title", "alpha")]))
+        self.assertIsNone(self.cache.find("http://passwordstate", "124", []))
+        self.assertEqual((5, 2), (self.cache.index_hits, self.cache.index_misses))
+        self.assertEqual((0, 0), (self.cache.hits, self.cache.misses))
+
+    def test_no_values_stored(self):
+        """the index holds hashes and ids, not field values"""
+        names = [name for name in os.listdir(self.path) if name.endswith(".idx")]
+        self.assertEqual(1, len(names))
+        with open(os.path.join(self.path, names[0]), "rb") as index_file:
+            self.assertNotIn(b"alpha", index_file.read())
+
+    def test_expired(self):
+        """indexes older than the ttl are not used"""
+        cache = ListCache(self.path, -1, "abc123xyz", "http://passwordstate")
+        self.assertIsNone(
+            cache.find("http://passwordstate", "123", [("UserName", "root")])
+        )
+
+    def test_not_indexable(self):
+        """a list without integer ids replaces the index of an older download"""
+        self.cache.set(
+            "http://passwordstate",
+            "123",
+            PasswordIndex([{"PasswordID": "1", "UserName": "root"}], ["UserName"]),
+        )
+        self.assertIsNone(
+            self.cache.find("http://passwordstate", "123", [("UserName", "root")])
+        )
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_password_id(self, mock_get):
+        """match fields resolve by the index without loading the list"""
+        api = PasswordState("http://passwordstate", "abc123xyz", cache=self.cache)
+        password = Password(
+            api,
+            "123",
+            {
+                "field": "GenericField1",
+                "field_id": "beta",
+                "field2": "UserName",
+                "field2_id": "app",
+            },
+        )
+
+        with mock.patch.object(self.cache, "get") as mock_cache_get:
+            self.assertEqual(3, api._get_password_id(password))
+        mock_cache_get.assert_not_called()
+        mock_get.assert_not_called()
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_download_lists_indexed(self, mock_get):
+        """batches and the list strategy use the index instead of the list"""
+        api = PasswordState(
+            "http://passwordstate",
+            "abc123xyz",
+            cache=self.cache,
+            lookup_strategy="list",
+        )
+        passwords = [
+            Password(api, "123", {"field": "GenericField1", "field_id": value})
+            for value in ("alpha", "gamma")
+        ]
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            self.assertEqual({}, api.download_lists(passwords, executor))
+        self.assertEqual(1, api._get_password_id(passwords[0]))
+        plan = api.plan_update(passwords[1], {"Title": "new"})
+
+        self.assertEqual("POST", plan.method)
+        self.assertEqual((0, 0), (self.cache.hits, self.cache.misses))
+        self.assertEqual((2, 0), (self.cache.index_hits, self.cache.index_misses))
+        mock_get.assert_not_called()
+
+
+class RevalidationTest(unittest.TestCase):
+    """RevalidationTest"""
+
+    passwords = [{"PasswordID": 1, "GenericField1": "alpha"}]
+    columns = ["GenericField1", "PasswordID"]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        # a ttl of -1 expires every cached list straight away
+        self.cache = ListCache(self.path, -1, "abc123xyz", "http://passwordstate")
+        self.api = PasswordState("http://passwordstate", "abc123xyz", cache=self.cache)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_not_modified(self, mock_get):
+        """an expired list is revalidated by its etag and reused on a 304"""
+        self.cache.set(
+            "http://passwordstate",
+            "123",
+            PasswordIndex(self.passwords, self.columns),
+            {"etag": '"v1"', "last_modified": "Sat, 17 Oct 2026 10:00:00 GMT"},
+        )
+        mock_get.return_value = make_response(None, 304)
+
+        index = self.api._get_password_list("123", ["GenericField1"])
+
+        self.assertEqual(self.passwords, index.passwords)
+        self.assertEqual(
+            {
+                "If-None-Match": '"v1"',
+                "If-Modified-Since": "Sat, 17 Oct 2026 10:00:00 GMT",
+            },
+            mock_get.call_args[1]["headers"],
+        )
+        self.assertEqual(1, self.cache.revalidations)
+        index, validators = self.cache.get_stale("http://passwordstate", "123", [])
+        self.assertEqual('"v1"', validators["etag"])
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_unchanged_digest(self, mock_get):
+        """without validators from the server an unchanged body is detected"""
+        mock_get.side_effect = lambda *args, **kwargs: make_response(self.passwords)
+
+        first = self.api._get_password_list("123", ["GenericField1"])
+        self.api._password_lists.clear()
+        second = self.api._get_password_list("123", ["GenericField1"])
+
+        self.assertEqual(first.passwords, second.passwords)
+        self.assertNotIn("headers", mock_get.call_args[1])
+        self.assertEqual(1, self.cache.revalidations)
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_modified(self, mock_get):
+        """a changed list replaces the cached one"""
+        self.cache.set(
+            "http://passwordstate",
+            "123",
+            PasswordIndex(self.passwords, self.columns),
+            {"etag": '"v1"'},
+        )
+        response = make_response([{"PasswordID": 2, "GenericField1": "beta"}])
+        response.headers["ETag"] = '"v2"'
+        mock_get.return_value = response
+
+        index = self.api._get_password_list("123", ["GenericField1"])
+
+        self.assertEqual([{"GenericField1": "beta", "PasswordID": 2}], index.passwords)
+        self.assertEqual(0, self.cache.revalidations)
+        index, validators = self.cache.get_stale("http://passwordstate", "123", [])
+        self.assertEqual('"v2"', validators["etag"])
+
+
+class RetryTest(unittest.TestCase):
+    """RetryTest"""
+
+    def make_api(self):
+        return PasswordState("http://passwordstate", "abc123xyz", retry_backoff=0.5)
+
+    @mock.patch("time.sleep")
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_get_retried(self, mock_get, mock_sleep):
+        """busy answers and dropped connections are retried for GET"""
+        busy = make_response({"error": "busy"}, 503)
+        busy.headers["Retry-After"] = "2"
+        mock_get.side_effect = [
+            busy,
+            requests.exceptions.ConnectionError("reset"),
+            make_response([{"PasswordID": 1}]),
+        ]
+
+        passwords = self.make_api()._request("passwords/1", "GET")
+
+        self.assertEqual([{"PasswordID": 1}], passwords)
+        self.assertEqual(3, mock_get.call_count)
+        self.assertEqual(2, mock_sleep.call_args_list[0][0][0])
+        self.assertTrue(0 <= mock_sleep.call_args_list[1][0][0] <= 1.0)
+
+    @mock.patch("time.sleep")
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_retries_exhausted(self, mock_get, mock_sleep):
+        """the last busy answer fails once the retries are used up"""
+        mock_get.side_effect = lambda *args, **kwargs: make_response(
+            {"error": "busy"}, 503
+        )
+
+        with self.assertRaises(PasswordStateException) as ctx:
+            self.make_api()._request("passwords/1", "GET")
+
+        self.assertEqual(4, mock_get.call_count)
+        self.assertEqual("Failed: {'error': 'busy'}", ctx.exception.msg)
+
+    @mock.patch("time.sleep")
+    @mock.patch("requests.Session.post", autospec=True)
+    def test_post_not_retried(self, mock_post, mock_sleep):
+        """a POST that may have reached the server is never sent twice"""
+        mock_post.side_effect = [
+            make_response({"error": "busy"}, 503),
+            make_response([]),
+        ]
+
+        with self.assertRaises(PasswordStateException):
+            self.make_api()._request("passwords", "POST", {"Title": "a"})
+
+        self.assertEqual(1, mock_post.call_count)
+
+    def test_post_retry_rules(self):
+        """a POST is retried only when it certainly was not processed"""
+        policy = RetryPolicy()
+
+        self.assertTrue(
+            policy.retry_error("POST", requests.exceptions.ConnectTimeout(), 0)
+        )
+        self.assertFalse(
+            policy.retry_error("POST", requests.exceptions.ReadTimeout(), 0)
+        )
+        refused = requests.exceptions.ConnectionError(
+            MaxRetryError(None, "/api/passwords", NewConnectionError(None, "refused"))
+        )
+        self.assertTrue(policy.retry_error("POST", refused, 0))
+        dropped = requests.exceptions.ConnectionError(
+            ProtocolError("Connection aborted.", ConnectionResetError())
+        )
+        self.assertFalse(policy.retry_error("POST", dropped, 0))
+        self.assertTrue(policy.retry_error("PUT", dropped, 0))
+        self.assertTrue(policy.retry_response("POST", make_response({}, 429), 0))
+        self.assertTrue(policy.retry_error("PUT", requests.exceptions.ReadTimeout(), 0))
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_plain_text_error(self, mock_get):
+        """a non-json error page still gives a readable error"""
+        response = requests.Response()
+        response.status_code = 500
+        response.raw = io.BytesIO(b"Internal Server Error")
+        mock_get.return_value = response
+
+        with self.assertRaises(PasswordStateException) as ctx:
+            self.make_api()._request("passwords/1", "GET")
+
+        self.assertEqual("Failed: HTTP 500 Internal Server Error", ctx.exception.msg)
+
+    @mock.patch("time.sleep")
+    @mock.patch("time.monotonic")
+    def test_token_bucket(self, mock_monotonic, mock_sleep):
+        """a burst beyond the rate waits for the next token"""
+        mock_monotonic.return_value = 100.0
+        bucket = TokenBucket(2)
+
+        bucket.acquire()
+        bucket.acquire()
+        mock_sleep.assert_not_called()
+        bucket.acquire()
+        mock_sleep.assert_called_once_with(0.5)
+
+
+class RequestStatsTest(unittest.TestCase):
+    """RequestStatsTest"""
+
+    def test_endpoint(self):
+        """ids and query values are left out of endpoints"""
+        self.assertEqual(
+            "GET passwords/{id}?QueryAll&ExcludePassword",
+            endpoint("GET", "passwords/12?QueryAll&ExcludePassword=true"),
+        )
+        self.assertEqual("PUT passwords", endpoint("PUT", "passwords"))
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_stats_result(self, mock_get):
+        """requests are counted per endpoint, failed ones as errors"""
+        body = [{"PasswordID": 1, "Title": "a"}]
+        mock_get.side_effect = [
+            make_response(body),
+            make_response(body),
+            make_response({"error": "not found"}, 404),
+        ]
+        api = PasswordState("http://passwordstate", "abc123xyz", stats=RequestStats())
+
+        api._request_list("passwords/1?QueryAll", ["PasswordID"])
+        api._request("passwords/1", "GET")
+        with self.assertRaises(PasswordStateException):
+            api._request("passwords/2", "GET")
+        stats = api.stats_result()["passwordstate_stats"]
+
+        self.assertEqual(3, stats["requests"])
+        self.assertEqual(1, stats["errors"])
+        self.assertEqual(2 * len(json.dumps(body)), stats["bytes"])
+        self.assertEqual(
+            1, stats["endpoints"]["GET passwords/{id}?QueryAll"]["requests"]
+        )
+        self.assertEqual(2, stats["endpoints"]["GET passwords/{id}"]["requests"])
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_stats_path(self, mock_get):
+        """every request is appended as a JSON line to the stats file"""
+        mock_get.return_value = make_response([])
+        path = tempfile.mktemp()
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        api = PasswordState(
+            "http://passwordstate", "abc123xyz", stats=RequestStats(path)
+        )
+
+        api._request("passwords/1", "GET")
+        api.stats_result()
+
+        with open(path) as stats_file:
+            records = [json.loads(line) for line in stats_file]
+        self.assertEqual(1, len(records))
+        self.assertEqual("GET passwords/{id}", records[0]["endpoint"])
+        self.assertEqual(200, records[0]["status"])
+
+    def test_disabled(self):
+        """without statistics nothing is added to the result"""
+        self.assertEqual(
+            {}, PasswordState("http://passwordstate", "abc").stats_result()
+        )
@@ -2,238 +2,237 @@
 
 """ PasswordState Ansible Module """
 
-from ansible.module_utils.basic import *
+import concurrent.futures
 
-import requests
-from json.decoder import JSONDecodeError
-from requests_ntlm import HttpNtlmAuth
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.passwordstate.client import Password
+from ansible.module_utils.passwordstate.client import PasswordIdException
+from ansible.module_utils.passwordstate.client import PasswordStateException
+from ansible.module_utils.passwordstate.client import UNKNOWN_CREATE
+from ansible.module_utils.passwordstate.stats import RequestStats
+from ansible.module_utils.passwordstate import client
 
 
-class PasswordIdException(Exception):
-    msg = "Either the password id or the match " "field id and value must be configured"
+class PasswordState(client.PasswordState):
+    """PasswordState reporting to the module"""
 
-
-class Password(object):
-    """Password"""
-
-    def __init__(self, api, password_list_id, matcher):
-        self.api = api
-        self.password_list_id = password_list_id
-        if "id" in matcher and matcher["id"] != None:
-            self.password_id = matcher["id"]
-        elif (
-            "field" in matcher
-            and "field_id" in matcher
-            and matcher["field"] != None
-            and matcher["field_id"] != None
-        ):
-            self.match_field = matcher["field"]
-            self.match_field_id = matcher["field_id"]
-        else:
-            raise PasswordIdException()
-
-    @property
-    def password(self):
-        """fetch the password from the api"""
-        return self.api.get_password_fields(self)["Password"]
-
-    @property
-    def type(self):
-        """the method to uniquely identify the password"""
-        if hasattr(self, "password_id"):
-            return "password_id"
-        elif hasattr(self, "match_field") and hasattr(self, "match_field_id"):
-            return "match_field"
-        raise PasswordIdException()
-
-    def update(self, fields):
-        """Update the password"""
-        self.api.update(self, fields)
-
-
-class PasswordState(object):
-    """PasswordState"""
-
-    def __init__(self, module, url, api_key, api_username=None, api_password=None):
+    def __init__(
+        self, module, url, api_key, api_username=None, api_password=None, **kwargs
+    ):
+        super(PasswordState, self).__init__(
+            url, api_key, api_username, api_password, **kwargs
+        )
         self.module = module
-        self.url = url
-        self.api_key = api_key
-        self.api_username = api_username
-        self.api_password = api_password
 
     def update(self, password, fields):
-        """update the password in PasswordState"""
-        if self._password_match(password, fields):
-            self.module.exit_json(changed=False)
+        """update the password in PasswordState, in check mode only work
+        out the write"""
+        try:
+            plan = self.plan_update(password, fields)
+            if not self.module.check_mode:
+                self.write(plan)
+        except PasswordStateException as inst:
+            self.module.fail_json(msg=inst.msg, **self.stats_result())
             return None
 
-        if password.type == "password_id":
-            params = {
-                "PasswordID": password.password_id,
-                "PasswordListID": password.password_list_id,
-            }
-            params = PasswordState._merge_dicts(fields, params)
-
-            self._request("passwords", "PUT", params)
-        elif password.type == "match_field":
-            if self._has_password(password):
-                pid = self._get_password_id(password)
-
-                params = {
-                    "PasswordID": pid,
-                    "PasswordListID": password.password_list_id,
-                }
-                params = PasswordState._merge_dicts(fields, params)
-
-                self._request("passwords", "PUT", params)
-            else:
-                if not "Title" in fields:
-                    self.module.fail_json(
-                        msg="Title is required when creating passwords"
-                    )
-                    return None
-
-                params = {
-                    "PasswordListID": password.password_list_id,
-                    password.match_field: password.match_field_id,
-                }
-                params = PasswordState._merge_dicts(fields, params)
-
-                self._request("passwords", "POST", params)
-
-        self.module.exit_json(changed=True)
+        result = {"changed": plan.method is not None}
+        if self.module._diff:
+            result["diff"] = plan.diff()
+        result.update(self.stats_result())
+        self.module.exit_json(**result)
         return None
 
-    def get_password_fields(self, password):
-        """get the password fields"""
-        if password.type == "password_id":
-            return self._get_password_by_id(password.password_id)
-        elif password.type == "match_field":
-            return self._get_password_by_field(password)
-
-    def _get_password_by_id(self, password_id):
-        """get the password by the password id"""
-        passwords = self._request("passwords/" + str(password_id), "GET")
-        if len(passwords) == 0:
-            self.module.fail_json(msg="Password not found")
-            return None
-        if len(passwords) > 1:
-            self.module.fail_json(msg="Multiple matching passwords found")
-            return None
-        return passwords[0]
-
-    def _get_password_by_field(self, password):
-        """get the password by a specific field"""
-        return self._get_password_by_id(self._get_password_id(password))
 
-    def _get_password_id(self, password):
-        """get the password id by using a specific field"""
-        uri = (
-            "passwords/" + password.password_list_id + "?QueryAll&ExcludePassword=true"
-        )
-        passwords = self._request(uri, "GET")
-        passwords = PasswordState._filter_passwords(
-            passwords, password.match_field, password.match_field_id
+def password_fields(title, username, new_password):
+    """the record fields to bring up to date"""
+    fields = {}
+    if title != None:
+        fields["Title"] = title
+    if username != None:
+        fields["UserName"] = username
+    if new_password != None:
+        fields["password"] = new_password
+    return fields
+
+
+def resolve_items(api, password_list_id, items):
+    """the Password of every item and its result so far, None and a failed
+    result for items without a matcher or duplicating an earlier one"""
+    passwords = []
+    results = []
+    seen = set()
+    for item in items:
+        result = dict(
+            (key, item[key])
+            for key in ("password_id", "match_field", "match_field_id", "title")
+            if item[key] != None
         )
-        if len(passwords) == 0:
-            self.module.fail_json(msg="Password not found")
-            return None
-        elif len(passwords) > 1:
-            self.module.fail_json(msg="Multiple matching passwords found")
-            return None
-
-        return passwords[0]["PasswordID"]
-
-    def _has_password(self, password):
-        """checks if the password exists"""
-        if password.type == "password_id":
-            uri = "passwords/" + password.password_id
-            passwords = self._request(uri, "GET")
-            if len(passwords) == 0:
-                return False
-            return True
-        elif password.type == "match_field":
-            plid = password.password_list_id
-            uri = "passwords/" + plid + "?QueryAll&ExcludePassword=true"
-            passwords = self._request(uri, "GET")
-            passwords = PasswordState._filter_passwords(
-                passwords, password.match_field, password.match_field_id
+        result["password_list_id"] = item["password_list_id"] or password_list_id
+        results.append(result)
+        try:
+            password = Password(
+                api,
+                result["password_list_id"],
+                {
+                    "id": item["password_id"],
+                    "field": item["match_field"],
+                    "field_id": item["match_field_id"],
+                },
             )
-
-            if len(passwords) == 1:
-                return True
-            elif len(passwords) > 1:
-                self.module.fail_json(msg="Multiple matching passwords found")
-                return None
-            return False
-
-    def _password_match(self, password, fields):
-        """checks if the password entity is up to date"""
-        match = True
-        if self._has_password(password):
-            current_password = self.get_password_fields(password)
-            if (
-                "password" in fields
-                and current_password["Password"] != fields["password"]
-            ):
-                match = False
-            if "Title" in fields and current_password["Title"] != fields["Title"]:
-                match = False
-            if (
-                "UserName" in fields
-                and current_password["UserName"] != fields["UserName"]
-            ):
-                match = False
+        except PasswordIdException as inst:
+            passwords.append(None)
+            result.update(status="failed", msg=inst.msg)
+            continue
+        # two writes to one record would race, or create it twice
+        if password.type == "password_id":
+            key = (None, str(password.password_id))
         else:
-            match = False
-        return match
-
-    def _request(self, uri, method, params=None):
-        """send a request to the api and return as json"""
-        request_methods = {
-            "GET": requests.get,
-            "PUT": requests.put,
-            "POST": requests.post,
-        }
-
+            key = (password.password_list_id, tuple(api._match_criteria(password)))
+        if key in seen:
+            passwords.append(None)
+            result.update(status="failed", msg="Duplicate password in passwords")
+            continue
+        seen.add(key)
+        passwords.append(password)
+    return passwords, results
+
+
+def plan_updates(api, items, passwords, results, executor, diff=False):
+    """the update plan of every resolved item, None for the others"""
+    plans = [None] * len(items)
+    statuses = {None: "unchanged", "PUT": "changed", "POST": "created"}
+
+    def plan(i):
+        item = items[i]
+        fields = password_fields(item["title"], item["username"], item["password"])
         try:
-            if self.api_key != None:
-                full_uri = self.url + "/api/" + uri
-                headers = {"APIKey": self.api_key}
-                response = request_methods[method](
-                    full_uri, headers=headers, params=params
-                )
-            else:
-                full_uri = self.url + "/winapi/" + uri
-                winauth = HttpNtlmAuth(self.api_username, self.api_password)
-                response = request_methods[method](
-                    full_uri, auth=winauth, params=params
-                )
-        except requests.exceptions.RequestException as inst:
-            self.module.fail_json(msg="Failed: %s" % str(inst))
-            return None
+            plans[i] = api.plan_update(passwords[i], fields)
+        except PasswordStateException as inst:
+            results[i].update(status="failed", msg=inst.msg)
+            return
+        results[i]["status"] = statuses[plans[i].method]
+        if diff:
+            results[i]["diff"] = plans[i].diff()
 
-        if response.status_code > 204:
-            self.module.fail_json(msg="Failed: %s" % str(response.json()))
-            return None
+    list(executor.map(plan, [i for i in range(len(items)) if passwords[i]]))
+    return plans
 
-        try:
-            return response.json()
-        except JSONDecodeError as inst:
-            self.module.fail_json(msg="Failed: %s" % str(inst))
-            return None
 
-    @staticmethod
-    def _filter_passwords(passwords, field, value):
-        """filter out passwords which does not match the specific field value"""
-        return [obj for i, obj in enumerate(passwords) if obj[field] == value]
+def write_updates(api, indexes, plans, results, executor):
+    """send the writes of the given plans one by one"""
 
-    @staticmethod
-    def _merge_dicts(xray, yankee):
-        """merge two dicts"""
-        zulu = xray.copy()
-        zulu.update(yankee)
-        return zulu
+    def write(i):
+        try:
+            api.write(plans[i])
+        except PasswordStateException as inst:
+            if plans[i].method == "POST" and inst.maybe_applied:
+                results[i].update(status="unknown", msg=UNKNOWN_CREATE % inst.msg)
+            else:
+                results[i].update(status="failed", msg=inst.msg)
+
+    list(executor.map(write, indexes))
+
+
+def create_new_passwords(api, indexes, plans, results, executor, chunk_size):
+    """create the new passwords of the given plans chunk_size at a time per
+    list with bulk requests"""
+    creates = {}
+    for i in indexes:
+        creates.setdefault(plans[i].params["PasswordListID"], []).append(i)
+    chunks = [
+        creates[list_id][start : start + chunk_size]
+        for list_id in sorted(creates)
+        for start in range(0, len(creates[list_id]), chunk_size)
+    ]
+
+    def create(chunk):
+        outcomes = api.create_passwords([plans[i] for i in chunk])
+        for i, (status, msg) in zip(chunk, outcomes):
+            if status != "created":
+                results[i].update(status=status, msg=msg)
+
+    list(executor.map(create, chunks))
+
+
+def update_passwords(
+    api,
+    password_list_id,
+    items,
+    max_workers=1,
+    check_mode=False,
+    diff=False,
+    chunk_size=0,
+):
+    """bring many passwords up to date, sharing list downloads between them
+
+    The password lists shared by several items are downloaded first, then
+    every item is planned, then the updates are written one by one and the
+    new passwords created one by one too, or chunk_size at a time per list
+    with bulk requests, all on a thread pool of at most max_workers threads.
+    A result is returned per item, in the order of the items; a failing
+    item does not stop the others. A new password that may have been
+    created by a failed write is reported as unknown. In check_mode nothing
+    is written, with diff each result has the diff of its write.
+    """
+    passwords, results = resolve_items(api, password_list_id, items)
+
+    # create the shared session before the workers start using it
+    api.session
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list_errors = api.download_lists(passwords, executor)
+        for i, password in enumerate(passwords):
+            if password is None or password.type != "match_field":
+                continue
+            if password.password_list_id in list_errors:
+                passwords[i] = None
+                results[i].update(
+                    status="failed", msg=list_errors[password.password_list_id]
+                )
+        plans = plan_updates(api, items, passwords, results, executor, diff)
+        if check_mode:
+            return results
+
+        writes = [i for i, plan in enumerate(plans) if plan and plan.method]
+        creates = []
+        if chunk_size > 0:
+            creates = [i for i in writes if plans[i].method == "POST"]
+            writes = [i for i in writes if plans[i].method != "POST"]
+        write_updates(api, writes, plans, results, executor)
+        create_new_passwords(api, creates, plans, results, executor, chunk_size)
+
+    return results
+
+
+def exit_bulk(module, api, items, results):
+    """end the module with the results of a passwords run, failing it if
+    any item failed or is unknown"""
+    diffs = []
+    for result in results:
+        if "diff" in result:
+            item_diff = result.pop("diff")
+            if result["status"] != "unchanged":
+                header = result.get("password_id") or result.get("match_field_id")
+                item_diff.update(before_header=header, after_header=header)
+                diffs.append(item_diff)
+    failed = [result for result in results if result["status"] in ("failed", "unknown")]
+    if failed:
+        module.fail_json(
+            msg="Failed to update %d of %d passwords" % (len(failed), len(items)),
+            changed=any(
+                result["status"] in ("changed", "created") for result in results
+            ),
+            results=results,
+            **api.stats_result()
+        )
+        return None
+    bulk_result = {
+        "changed": any(result["status"] != "unchanged" for result in results),
+        "results": results,
+    }
+    if module._diff:
+        bulk_result["diff"] = diffs
+    bulk_result.update(api.stats_result())
+    module.exit_json(**bulk_result)
 
 
 def main():
@@ -249,12 +248,47 @@ def main():
             "match_field": {"required": False},
             "match_field_id": {"required": False},
             "password_id": {"required": False},
+            "pool_size": {"required": False, "type": "int", "default": 10},
+            "retries": {"required": False, "type": "int", "default": 3},
+            "retry_backoff": {"required": False, "type": "float", "default": 1.0},
+            "rate_limit": {"required": False, "type": "float"},
+            "stats": {"required": False, "type": "bool", "default": False},
+            "stats_path": {"required": False, "type": "path"},
+            "lookup_strategy": {
+                "required": False,
+                "default": "auto",
+                "choices": ["auto", "search", "list"],
+            },
             "username": {"required": False},
             "password": {"required": False},
             "title": {"required": False},
+            "max_workers": {"required": False, "type": "int", "default": 4},
+            "chunk_size": {"required": False, "type": "int", "default": 0},
+            "passwords": {
+                "required": False,
+                "type": "list",
+                "elements": "dict",
+                "options": {
+                    "password_list_id": {"required": False},
+                    "password_id": {"required": False},
+                    "match_field": {"required": False},
+                    "match_field_id": {"required": False},
+                    "title": {"required": False},
+                    "username": {"required": False},
+                    "password": {"required": False, "no_log": True},
+                },
+            },
         },
-        supports_check_mode=False,
-        mutually_exclusive=[("api_key", "api_username")],
+        supports_check_mode=True,
+        mutually_exclusive=[
+            ("api_key", "api_username"),
+            ("passwords", "password_id"),
+            ("passwords", "match_field"),
+            ("passwords", "match_field_id"),
+            ("passwords", "title"),
+            ("passwords", "username"),
+            ("passwords", "password"),
+        ],
         required_one_of=[("api_key", "api_username")],
         required_together=[("api_username", "api_password")],
     )
@@ -268,24 +302,57 @@ def main():
     match_field = module.params["match_field"]
     match_field_id = module.params["match_field_id"]
     password_id = module.params["password_id"]
+    pool_size = module.params["pool_size"]
+    retries = module.params["retries"]
+    retry_backoff = module.params["retry_backoff"]
+    rate_limit = module.params["rate_limit"]
+    stats = None
+    if module.params["stats"] or module.params["stats_path"]:
+        stats = RequestStats(module.params["stats_path"])
+    lookup_strategy = module.params["lookup_strategy"]
     username = module.params["username"]
     new_password = module.params["password"]
     title = module.params["title"]
-
-    api = PasswordState(module, url, api_key, api_username, api_password)
-    password = Password(
-        api,
-        password_list_id,
-        {"id": password_id, "field": match_field, "field_id": match_field_id},
+    max_workers = module.params["max_workers"]
+    chunk_size = module.params["chunk_size"]
+    items = module.params["passwords"]
+
+    api = PasswordState(
+        module,
+        url,
+        api_key,
+        api_username,
+        api_password,
+        pool_size=pool_size,
+        retries=retries,
+        retry_backoff=retry_backoff,
+        rate_limit=rate_limit,
+        stats=stats,
+        lookup_strategy=lookup_strategy,
     )
 
-    fields = {}
-    if title != None:
-        fields["Title"] = title
-    if username != None:
-        fields["UserName"] = username
-    if password != None:
-        fields["password"] = new_password
+    if items is not None:
+        results = update_passwords(
+            api,
+            password_list_id,
+            items,
+            max_workers,
+            check_mode=module.check_mode,
+            diff=module._diff,
+            chunk_size=chunk_size,
+        )
+        exit_bulk(module, api, items, results)
+
+    try:
+        password = Password(
+            api,
+            password_list_id,
+            {"id": password_id, "field": match_field, "field_id": match_field_id},
+        )
+    except PasswordIdException as inst:
+        module.fail_json(msg=inst.msg)
+
+    fields = password_fields(title, username, new_password)
 
     if state == "present":
         password.update(fields)
@@ -4,9 +4,24 @@ import unittest
 
 from passwordstate_password import Password
 from passwordstate_password import PasswordState
+from ansible.module_utils.passwordstate.index import PasswordIndex
 from passwordstate_password import PasswordIdException
+from ansible.module_utils.passwordstate.client import PasswordListIdException
+from passwordstate_password import exit_bulk
+from passwordstate_password import update_passwords
+from ansible.module_utils.passwordstate import client
 from ddt import ddt, data, unpack
+from testhelpers import make_response
 import mock
+import requests
+
+
+def make_module(check_mode=False, diff=False):
+    """a mocked AnsibleModule"""
+    module = mock.Mock()
+    module.check_mode = check_mode
+    module._diff = diff
+    return module
 
 
 class PasswordTest(unittest.TestCase):
@@ -135,7 +150,7 @@ class PasswordStateTest(unittest.TestCase):
 
     def test_init(self):
         """test constructor"""
-        module = mock.Mock()
+        module = make_module()
         url = "http://passwordstate"
         api_key = "abc123xyz"
         passwordstate = PasswordState(module, url, api_key)
@@ -144,6 +159,26 @@ class PasswordStateTest(unittest.TestCase):
         self.assertEqual(passwordstate.url, url)
         self.assertEqual(passwordstate.api_key, api_key)
 
+    def test_session_api_key(self):
+        """session is created once and carries the api key"""
+        passwordstate = PasswordState(mock.Mock(), "http://passwordstate", "abc123")
+        session = passwordstate.session
+
+        self.assertIs(session, passwordstate.session)
+        self.assertEqual(session.headers["APIKey"], "abc123")
+        self.assertIsNone(session.auth)
+
+    def test_session_winapi(self):
+        """session binds ntlm auth once"""
+        passwordstate = PasswordState(
+            mock.Mock(), "http://passwordstate", None, "user", "secret"
+        )
+        session = passwordstate.session
+
+        self.assertIs(session, passwordstate.session)
+        self.assertEqual(session.auth.username, "user")
+        self.assertNotIn("APIKey", session.headers)
+
     def test_filter_passwords(self):
         """test filter passwords"""
         passwords = [
@@ -151,7 +186,7 @@ class PasswordStateTest(unittest.TestCase):
             {"GenericField1": "charlie", "GenericField2": "delta"},
             {"GenericField1": "echo", "GenericField2": "alpha"},
         ]
-        filtered = PasswordState._filter_passwords(passwords, "GenericField1", "alpha")
+        filtered = PasswordIndex(passwords).find("GenericField1", "alpha")
         self.assertEqual(len(filtered), 1)
         self.assertEqual(filtered[0]["GenericField1"], "alpha")
 
@@ -173,7 +208,7 @@ class PasswordStateTest(unittest.TestCase):
 
         self.assertEqual(actual, expected)
 
-    @mock.patch("requests.get", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
     def test_update_passwordmatch_match_id(self, mock_get):
         """password that doesnt need updating"""
         value = [
@@ -188,7 +223,7 @@ class PasswordStateTest(unittest.TestCase):
 
         mock_get.return_value = mock.Mock(status_code=200, json=lambda: value)
 
-        module = mock.Mock()
+        module = make_module()
         module.exit_json = mock.MagicMock()
         url = "http://passwordstate"
         api_key = "abc123xyz"
@@ -201,7 +236,7 @@ class PasswordStateTest(unittest.TestCase):
 
         module.exit_json.assert_called_with(changed=False)
 
-    @mock.patch("requests.get", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
     def test_update_passwordmatch_match_field(self, mock_get):
         """password that doesnt need updating"""
         value = [
@@ -215,7 +250,7 @@ class PasswordStateTest(unittest.TestCase):
         ]
         mock_get.return_value = mock.Mock(status_code=200, json=lambda: value)
 
-        module = mock.Mock()
+        module = make_module()
         module.exit_json = mock.MagicMock()
         url = "http://passwordstate"
         api_key = "abc123xyz"
@@ -230,7 +265,8 @@ class PasswordStateTest(unittest.TestCase):
 
         module.exit_json.assert_called_with(changed=False)
 
-    @mock.patch("requests.get", autospec=True)
+    @mock.patch("requests.Session.put", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
     @data(
         {"password": "newpassword"},
         {"Title": "newtitle"},
@@ -238,7 +274,7 @@ class PasswordStateTest(unittest.TestCase):
         {"password": "foo", "Title": "newtitle"},
         {"Title": "bar", "UserName": "newuser"},
     )
-    def test_update_passwordmatch_nomatch_id(self, fields, mock_get):
+    def test_update_passwordmatch_nomatch_id(self, fields, mock_get, mock_put):
         """password that doesnt need updating"""
         value = [
             {
@@ -251,7 +287,9 @@ class PasswordStateTest(unittest.TestCase):
         ]
         mock_get.return_value = mock.Mock(status_code=200, json=lambda: value)
 
-        module = mock.Mock()
+        mock_put.return_value = mock.Mock(status_code=200, json=lambda: [])
+
+        module = make_module()
         module.exit_json = mock.MagicMock()
         url = "http://passwordstate"
         api_key = "abc123xyz"
@@ -263,7 +301,8 @@ class PasswordStateTest(unittest.TestCase):
 
         module.exit_json.assert_called_with(changed=True)
 
-    @mock.patch("requests.get", autospec=True)
+    @mock.patch("requests.Session.put", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
     @data(
         {"password": "newpassword"},
         {"Title": "newtitle"},
@@ -271,7 +310,7 @@ class PasswordStateTest(unittest.TestCase):
         {"password": "foo", "Title": "newtitle"},
         {"Title": "bar", "UserName": "newuser"},
     )
-    def test_update_passwordmatch_nomatch_field(self, fields, mock_get):
+    def test_update_passwordmatch_nomatch_field(self, fields, mock_get, mock_put):
         """password that doesnt need updating"""
         value = [
             {
@@ -284,7 +323,9 @@ class PasswordStateTest(unittest.TestCase):
         ]
         mock_get.return_value = mock.Mock(status_code=200, json=lambda: value)
 
-        module = mock.Mock()
+        mock_put.return_value = mock.Mock(status_code=200, json=lambda: [])
+
+        module = make_module()
         module.exit_json = mock.MagicMock()
         url = "http://passwordstate"
         api_key = "abc123xyz"
@@ -298,12 +339,12 @@ class PasswordStateTest(unittest.TestCase):
 
         module.exit_json.assert_called_with(changed=True)
 
-    @mock.patch("requests.get", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
     def test_update_newpassword_notitle(self, mock_get):
         """password that doesnt need updating"""
         mock_get.return_value = mock.Mock(status_code=200, json=lambda: [])
 
-        module = mock.Mock()
+        module = make_module()
         module.fail_json = mock.MagicMock()
         url = "http://passwordstate"
         api_key = "abc123xyz"
@@ -320,12 +361,15 @@ class PasswordStateTest(unittest.TestCase):
             msg="Title is required when creating passwords"
         )
 
-    @mock.patch("requests.get", autospec=True)
-    def test_update_newpassword_withtitle(self, mock_get):
+    @mock.patch("requests.Session.post", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_update_newpassword_withtitle(self, mock_get, mock_post):
         """password that doesnt need updating"""
         mock_get.return_value = mock.Mock(status_code=200, json=lambda: [])
 
-        module = mock.Mock()
+        mock_post.return_value = mock.Mock(status_code=200, json=lambda: [])
+
+        module = make_module()
         module.exit_json = mock.MagicMock()
         url = "http://passwordstate"
         api_key = "abc123xyz"
@@ -339,3 +383,468 @@ class PasswordStateTest(unittest.TestCase):
         password.update(fields)
 
         module.exit_json.assert_called_with(changed=True)
+
+    @mock.patch("requests.Session.put", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_update_match_field_requests(self, mock_get, mock_put):
+        """update downloads the list once, the record once and puts once"""
+        value = [
+            {
+                "Password": "foo",
+                "Title": "bar",
+                "UserName": "foobar",
+                "GenericField1": "123",
+                "PasswordID": 999,
+            }
+        ]
+        mock_get.return_value = mock.Mock(status_code=200, json=lambda: value)
+        mock_put.return_value = mock.Mock(status_code=200, json=lambda: value)
+
+        module = make_module()
+        api = PasswordState(module, "http://passwordstate", "abc123xyz")
+        password = Password(
+            api, "123", {"id": None, "field": "GenericField1", "field_id": "123"}
+        )
+
+        password.update({"password": "newpassword"})
+
+        self.assertEqual(2, mock_get.call_count)
+        mock_put.assert_called_once_with(
+            api.session,
+            "http://passwordstate/api/passwords",
+            params={
+                "password": "newpassword",
+                "PasswordID": 999,
+                "PasswordListID": "123",
+            },
+        )
+        module.exit_json.assert_called_with(changed=True)
+
+    @mock.patch("requests.Session.post", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_plan_update_create(self, mock_get, mock_post):
+        """a missing password is planned as a single post"""
+        mock_get.return_value = mock.Mock(status_code=200, json=lambda: [])
+
+        api = PasswordState(mock.Mock(), "http://passwordstate", "abc123xyz")
+        password = Password(
+            api, "123", {"id": None, "field": "GenericField1", "field_id": "123"}
+        )
+
+        plan = api.plan_update(password, {"Title": "mytitle"})
+
+        self.assertEqual("POST", plan.method)
+        self.assertEqual(
+            {"Title": "mytitle", "PasswordListID": "123", "GenericField1": "123"},
+            plan.params,
+        )
+        self.assertEqual(1, mock_get.call_count)
+        mock_post.assert_not_called()
+
+    @mock.patch("requests.Session.get", autospec=True)
+    @data(
+        ("auto", "http://passwordstate/api/searchpasswords/123"),
+        ("search", "http://passwordstate/api/searchpasswords/123"),
+        (
+            "list",
+            "http://passwordstate/api/passwords/123?QueryAll&ExcludePassword=true",
+        ),
+    )
+    @unpack
+    def test_plan_update_lookup_strategy(self, strategy, uri, mock_get):
+        """the lookup strategy picks search or list download"""
+        mock_get.return_value = make_response([])
+
+        api = PasswordState(
+            mock.Mock(), "http://passwordstate", "abc123xyz", lookup_strategy=strategy
+        )
+        password = Password(
+            api, "123", {"id": None, "field": "GenericField1", "field_id": "123"}
+        )
+
+        api.plan_update(password, {"Title": "mytitle"})
+
+        self.assertEqual(uri, mock_get.call_args[0][1])
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_request_list(self, mock_get):
+        """list entries keep only the requested columns"""
+        mock_get.return_value = make_response(
+            [{"PasswordID": 1, "Title": "a", "Notes": "long notes"}]
+        )
+        api = PasswordState(mock.Mock(), "http://passwordstate", "abc123xyz")
+
+        passwords = api._request_list("passwords/1", ["PasswordID", "Title"])
+
+        self.assertEqual([{"PasswordID": 1, "Title": "a"}], passwords)
+
+
+class CheckModeTest(unittest.TestCase):
+    """CheckModeTest"""
+
+    record = {
+        "Password": "foo",
+        "Title": "bar",
+        "UserName": "foobar",
+        "GenericField1": "123",
+        "PasswordID": 999,
+    }
+
+    @mock.patch("requests.Session.put", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_check_mode(self, mock_get, mock_put):
+        """check mode resolves the record as usual but writes nothing"""
+        mock_get.side_effect = lambda *args, **kwargs: make_response([self.record])
+
+        module = make_module(check_mode=True, diff=True)
+        api = PasswordState(module, "http://passwordstate", "abc123xyz")
+        password = Password(
+            api, "123", {"id": None, "field": "GenericField1", "field_id": "123"}
+        )
+
+        password.update({"password": "newpassword", "Title": "bar"})
+
+        self.assertEqual(2, mock_get.call_count)
+        mock_put.assert_not_called()
+        module.exit_json.assert_called_with(
+            changed=True,
+            diff={
+                "before": {"Password": "********", "Title": "bar"},
+                "after": {"Password": "******** (changed)", "Title": "bar"},
+            },
+        )
+
+    def test_diff_create(self):
+        """a new password has no before, its password is masked"""
+        plan = client.UpdatePlan(
+            "POST",
+            {
+                "Title": "t",
+                "password": "secret",
+                "GenericField1": "host1",
+                "PasswordListID": "123",
+            },
+        )
+
+        self.assertEqual(
+            {
+                "before": {},
+                "after": {
+                    "Title": "t",
+                    "Password": "********",
+                    "GenericField1": "host1",
+                },
+            },
+            plan.diff(),
+        )
+
+    @mock.patch("requests.Session.post", autospec=True)
+    @mock.patch("requests.Session.put", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_update_passwords_check_mode(self, mock_get, mock_put, mock_post):
+        """bulk check mode reports the would-be writes without sending them"""
+        mock_get.side_effect = lambda *args, **kwargs: make_response([self.record])
+        api = PasswordState(make_module(), "http://passwordstate", "abc123xyz")
+
+        results = update_passwords(
+            api,
+            "123",
+            [make_item(password_id="999", username="admin")],
+            check_mode=True,
+            diff=True,
+        )
+
+        self.assertEqual("changed", results[0]["status"])
+        self.assertEqual(
+            {"before": {"UserName": "foobar"}, "after": {"UserName": "admin"}},
+            results[0]["diff"],
+        )
+        mock_put.assert_not_called()
+        mock_post.assert_not_called()
+
+
+def make_item(**kwargs):
+    """a passwords item with every option set"""
+    item = dict(
+        (key, None)
+        for key in (
+            "password_list_id",
+            "password_id",
+            "match_field",
+            "match_field_id",
+            "title",
+            "username",
+            "password",
+        )
+    )
+    item.update(kwargs)
+    return item
+
+
+class UpdatePasswordsTest(unittest.TestCase):
+
+    RECORDS = {
+        1: {"PasswordID": 1, "Title": "a", "UserName": "u", "Password": "p1"},
+        2: {"PasswordID": 2, "Title": "b", "UserName": "u", "Password": "p2"},
+    }
+
+    def fake_get(self, session, uri, params=None, stream=False):
+        if "QueryAll" in uri:
+            return make_response(
+                [
+                    {"PasswordID": 1, "GenericField1": "host1"},
+                    {"PasswordID": 2, "GenericField1": "host2"},
+                ]
+            )
+        return make_response([self.RECORDS[int(uri.rsplit("/", 1)[1])]])
+
+    @mock.patch("requests.Session.post", autospec=True)
+    @mock.patch("requests.Session.put", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_update_passwords(self, mock_get, mock_put, mock_post):
+        """one list download serves every item, only needed writes are sent"""
+        mock_get.side_effect = self.fake_get
+        mock_put.return_value = make_response([])
+        mock_post.return_value = make_response([{"PasswordID": 3}])
+        api = PasswordState(mock.Mock(), "http://passwordstate", "abc123xyz")
+
+        results = update_passwords(
+            api,
+            "123",
+            [
+                make_item(
+                    match_field="GenericField1", match_field_id="host1", password="p1"
+                ),
+                make_item(
+                    match_field="GenericField1", match_field_id="host2", password="new"
+                ),
+                make_item(
+                    match_field="GenericField1", match_field_id="host3", title="c"
+                ),
+            ],
+            max_workers=3,
+        )
+
+        self.assertEqual(
+            ["unchanged", "changed", "created"],
+            [result["status"] for result in results],
+        )
+        list_gets = [c for c in mock_get.call_args_list if "QueryAll" in c[0][1]]
+        self.assertEqual(1, len(list_gets))
+        self.assertEqual(3, mock_get.call_count)
+        mock_put.assert_called_once_with(
+            api.session,
+            "http://passwordstate/api/passwords",
+            params={"password": "new", "PasswordID": 2, "PasswordListID": "123"},
+        )
+        mock_post.assert_called_once_with(
+            api.session,
+            "http://passwordstate/api/passwords",
+            params={"Title": "c", "GenericField1": "host3", "PasswordListID": "123"},
+        )
+
+    @mock.patch("requests.Session.put", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_update_passwords_errors(self, mock_get, mock_put):
+        """failing items are reported without stopping the others"""
+        mock_get.side_effect = self.fake_get
+        mock_put.return_value = make_response([])
+        api = PasswordState(mock.Mock(), "http://passwordstate", "abc123xyz")
+
+        results = update_passwords(
+            api,
+            "123",
+            [
+                make_item(password_id="1", password="new"),
+                make_item(password_id="1", password="other"),
+                make_item(title="no matcher"),
+            ],
+        )
+
+        self.assertEqual(
+            [
+                {"password_id": "1", "password_list_id": "123", "status": "changed"},
+                {
+                    "password_id": "1",
+                    "password_list_id": "123",
+                    "status": "failed",
+                    "msg": "Duplicate password in passwords",
+                },
+                {
+                    "title": "no matcher",
+                    "password_list_id": "123",
+                    "status": "failed",
+                    "msg": PasswordIdException.msg,
+                },
+            ],
+            results,
+        )
+        self.assertEqual(1, mock_put.call_count)
+
+    @mock.patch("requests.Session.put", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_update_passwords_no_list_id(self, mock_get, mock_put):
+        """a match field item without a list id fails only itself"""
+        mock_get.side_effect = self.fake_get
+        mock_put.return_value = make_response([])
+        api = PasswordState(mock.Mock(), "http://passwordstate", "abc123xyz")
+
+        results = update_passwords(
+            api,
+            None,
+            [
+                make_item(match_field="GenericField1", match_field_id="host1"),
+                make_item(password_id="1", password="new"),
+            ],
+            max_workers=2,
+        )
+
+        self.assertEqual(
+            [("failed", PasswordListIdException.msg), ("changed", None)],
+            [(result["status"], result.get("msg")) for result in results],
+        )
+        self.assertEqual(1, mock_put.call_count)
+
+    @mock.patch("requests.Session.post", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_update_passwords_bulk_create(self, mock_get, mock_post):
+        """new passwords are created in chunks, failures map back to items"""
+        mock_get.side_effect = self.fake_get
+
+        def post(session, uri, params=None, json=None):
+            return make_response(
+                [
+                    {"PasswordID": 10} if item["Title"] != "bad" else {"error": "bad"}
+                    for item in json
+                ]
+            )
+
+        mock_post.side_effect = post
+        api = PasswordState(mock.Mock(), "http://passwordstate", "abc123xyz")
+        items = [
+            make_item(
+                password_list_id=list_id,
+                match_field="GenericField1",
+                match_field_id="new%d" % n,
+                title="bad" if n == 1 else "t",
+            )
+            for list_id in ("123", "456")
+            for n in range(3)
+        ]
+
+        results = update_passwords(api, None, items, chunk_size=2)
+
+        self.assertEqual(
+            ["created", "failed", "created"] * 2,
+            [result["status"] for result in results],
+        )
+        self.assertEqual("Failed: {'error': 'bad'}", results[1]["msg"])
+        chunks = [
+            [(item["PasswordListID"], item["GenericField1"]) for item in c[1]["json"]]
+            for c in mock_post.call_args_list
+        ]
+        self.assertEqual(
+            sorted(
+                [
+                    [("123", "new0"), ("123", "new1")],
+                    [("123", "new2")],
+                    [("456", "new0"), ("456", "new1")],
+                    [("456", "new2")],
+                ]
+            ),
+            sorted(chunks),
+        )
+
+    @mock.patch("requests.Session.post", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_update_passwords_bulk_request_failed(self, mock_get, mock_post):
+        """a failed bulk request fails every item of its chunk"""
+        mock_get.side_effect = self.fake_get
+        mock_post.return_value = make_response({"error": "denied"}, 403)
+        api = PasswordState(mock.Mock(), "http://passwordstate", "abc123xyz")
+        items = [
+            make_item(
+                match_field="GenericField1", match_field_id="new%d" % n, title="t"
+            )
+            for n in range(2)
+        ]
+
+        results = update_passwords(api, "123", items, chunk_size=2)
+
+        self.assertEqual(
+            [("failed", "Failed: {'error': 'denied'}")] * 2,
+            [(result["status"], result["msg"]) for result in results],
+        )
+        self.assertEqual(1, mock_post.call_count)
+
+    @mock.patch("requests.Session.post", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_update_passwords_bulk_maybe_created(self, mock_get, mock_post):
+        """a bulk request that may have been applied leaves its items unknown"""
+        mock_get.side_effect = self.fake_get
+        mock_post.side_effect = [
+            make_response({"error": "gateway"}, 500),
+            requests.exceptions.ReadTimeout("read timed out"),
+        ]
+        api = PasswordState(mock.Mock(), "http://passwordstate", "abc123xyz", retries=0)
+        items = [
+            make_item(
+                match_field="GenericField1", match_field_id="new%d" % n, title="t"
+            )
+            for n in range(4)
+        ]
+
+        results = update_passwords(api, "123", items, chunk_size=2)
+
+        self.assertEqual(["unknown"] * 4, [result["status"] for result in results])
+        self.assertTrue(
+            all("verify before rerunning" in result["msg"] for result in results)
+        )
+
+    @mock.patch("requests.Session.post", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_update_passwords_bulk_unexpected_answer(self, mock_get, mock_post):
+        """an answer not matching the chunk maps back by match field or Title"""
+        mock_get.side_effect = self.fake_get
+        mock_post.side_effect = [
+            make_response(
+                [
+                    {"PasswordID": 12, "GenericField1": "new2"},
+                    {"PasswordID": 10, "GenericField1": "new0"},
+                ]
+            ),
+            make_response([{"PasswordID": 13, "Title": "t3"}]),
+        ]
+        api = PasswordState(mock.Mock(), "http://passwordstate", "abc123xyz")
+        items = [
+            make_item(
+                match_field="GenericField1",
+                match_field_id="new%d" % n,
+                title="t%d" % n,
+            )
+            for n in range(5)
+        ]
+
+        results = update_passwords(api, "123", items, chunk_size=3)
+
+        self.assertEqual(
+            ["created", "unknown", "created", "created", "unknown"],
+            [result["status"] for result in results],
+        )
+        self.assertIn("verify before rerunning", results[1]["msg"])
+
+    def test_exit_bulk_failed_changed(self):
+        """a failing run still reports the writes it made"""
+        module = make_module()
+        api = PasswordState(module, "http://passwordstate", "abc123xyz")
+        results = [
+            {"password_id": "1", "status": "changed"},
+            {"password_id": "2", "status": "failed", "msg": "Password not found"},
+        ]
+
+        exit_bulk(module, api, [{}, {}], results)
+
+        module.fail_json.assert_called_once_with(
+            msg="Failed to update 1 of 2 passwords", changed=True, results=results
+        )
+        module.exit_json.assert_not_called()
@@ -2,309 +2,229 @@
 
 """ PasswordState Ansible Module """
 
-from ansible.module_utils.basic import *
-
-import requests
-from json.decoder import JSONDecodeError
-from requests_ntlm import HttpNtlmAuth
-
-
-class PasswordIdException(Exception):
-    msg = "Either the password id or the match " "field id and value must be configured"
-
-
-class Password(object):
-    """Password"""
-
-    def __init__(self, api, password_list_id, matcher):
-        self.api = api
-        self.password_list_id = password_list_id
-        if matcher["id"] != None:
-            self.password_id = matcher["id"]
-        elif matcher["field"] != None and matcher["field_id"] != None:
-            self.match_field = matcher["field"]
-            self.match_field_id = matcher["field_id"]
-            if matcher["field2"] != None and matcher["field2_id"] != None:
-                self.match_field2 = matcher["field2"]
-                self.match_field2_id = matcher["field2_id"]
-        else:
-            raise PasswordIdException()
+import concurrent.futures
+
+from ansible.module_utils.basic import AnsibleModule, missing_required_lib
+from ansible.module_utils.passwordstate.cache import HAS_CRYPTOGRAPHY
+from ansible.module_utils.passwordstate.cache import ListCache
+from ansible.module_utils.passwordstate.cache import cache_secret
+from ansible.module_utils.passwordstate.client import PasswordIdException
+from ansible.module_utils.passwordstate.client import PasswordState
+from ansible.module_utils.passwordstate.client import PasswordStateException
+from ansible.module_utils.passwordstate.stats import RequestStats
+from ansible.module_utils.passwordstate import client
+
+# the facts gathered for every password, each a property of Password
+FACTS = (
+    "passwordid",
+    "password",
+    "username",
+    "title",
+    "hostname",
+    "domain",
+    "description",
+    "notes",
+    "url",
+    "accounttype",
+    "accounttypeid",
+    "genericfield1",
+    "genericfield2",
+    "genericfield3",
+    "genericfield4",
+    "genericfield5",
+    "genericfield6",
+    "genericfield7",
+    "genericfield8",
+    "genericfield9",
+    "genericfield10",
+    "genericfieldinfo",
+    "expirydate",
+)
+
+
+class Password(client.Password):
+    """Password with the facts the module returns"""
 
     @property
     def passwordid(self):
         """fetch the passwordid of password from the api"""
-        return self.api.get_password_fields(self)["PasswordID"]
-
-    @property
-    def password(self):
-        """fetch the password from the api"""
-        return self.api.get_password_fields(self)["Password"]
+        return self.fields["PasswordID"]
 
     @property
     def username(self):
         """fetch the username of password from the api"""
-        return self.api.get_password_fields(self)["UserName"]
+        return self.fields["UserName"]
 
     @property
     def title(self):
         """fetch the title of password from the api"""
-        return self.api.get_password_fields(self)["Title"]
+        return self.fields["Title"]
 
     @property
     def hostname(self):
         """fetch the hostame of password from the api"""
-        return self.api.get_password_fields(self)["HostName"]
+        return self.fields["HostName"]
 
     @property
     def domain(self):
         """fetch the domain of password from the api"""
-        return self.api.get_password_fields(self)["Domain"]
+        return self.fields["Domain"]
 
     @property
     def description(self):
         """fetch the Description of password from the api"""
-        return self.api.get_password_fields(self)["Description"]
+        return self.fields["Description"]
 
     @property
     def notes(self):
         """fetch the Notes of password from the api"""
-        return self.api.get_password_fields(self)["Notes"]
+        return self.fields["Notes"]
 
     @property
     def url(self):
         """fetch the URL of password from the api"""
-        return self.api.get_password_fields(self)["URL"]
+        return self.fields["URL"]
 
     @property
     def accounttype(self):
         """fetch the URL of password from the api"""
-        return self.api.get_password_fields(self)["AccountType"]
+        return self.fields["AccountType"]
 
     @property
     def accounttypeid(self):
         """fetch the URL of password from the api"""
-        return self.api.get_password_fields(self)["AccountTypeID"]
+        return self.fields["AccountTypeID"]
 
     @property
     def genericfield1(self):
         """fetch the GenericField1 of password from the api"""
-        return self.api.get_password_fields(self)["GenericField1"]
+        return self.fields["GenericField1"]
 
     @property
     def genericfield2(self):
         """fetch the GenericField2 of password from the api"""
-        return self.api.get_password_fields(self)["GenericField2"]
+        return self.fields["GenericField2"]
 
     @property
     def genericfield3(self):
         """fetch the GenericField3 of password from the api"""
-        return self.api.get_password_fields(self)["GenericField3"]
+        return self.fields["GenericField3"]
 
     @property
     def genericfield4(self):
         """fetch the GenericField4 of password from the api"""
-        return self.api.get_password_fields(self)["GenericField4"]
+        return self.fields["GenericField4"]
 
     @property
     def genericfield5(self):
         """fetch the GenericField5 of password from the api"""
-        return self.api.get_password_fields(self)["GenericField5"]
+        return self.fields["GenericField5"]
 
     @property
     def genericfield6(self):
         """fetch the GenericField6 of password from the api"""
-        return self.api.get_password_fields(self)["GenericField6"]
+        return self.fields["GenericField6"]
 
     @property
     def genericfield7(self):
         """fetch the GenericField7 of password from the api"""
-        return self.api.get_password_fields(self)["GenericField7"]
+        return self.fields["GenericField7"]
 
     @property
     def genericfield8(self):
         """fetch the GenericField8 of password from the api"""
-        return self.api.get_password_fields(self)["GenericField8"]
+        return self.fields["GenericField8"]
 
     @property
     def genericfield9(self):
         """fetch the GenericField9 of password from the api"""
-        return self.api.get_password_fields(self)["GenericField9"]
+        return self.fields["GenericField9"]
 
     @property
     def genericfield10(self):
         """fetch the GenericField10 of password from the api"""
-        return self.api.get_password_fields(self)["GenericField10"]
+        return self.fields["GenericField10"]
 
     @property
     def genericfieldinfo(self):
         """fetch the GenericFieldInfo of password from the api"""
-        return self.api.get_password_fields(self)["GenericFieldInfo"]
+        return self.fields["GenericFieldInfo"]
 
     @property
     def expirydate(self):
         """fetch the ExpiryDate of password from the api"""
-        return self.api.get_password_fields(self)["ExpiryDate"]
+        return self.fields["ExpiryDate"]
 
-    @property
-    def type(self):
-        """the method to uniquely identify the password"""
-        if hasattr(self, "password_id"):
-            return "password_id"
-        elif (hasattr(self, "match_field") and hasattr(self, "match_field_id")) or (
-            hasattr(self, "match_field2") and hasattr(self, "match_field2_id")
-        ):
-            return "match_field"
-        raise PasswordIdException()
-
-    def gather_facts(self, fact_name):
-        """gather facts"""
+    def gather_facts(self, fact_name, fields=None):
+        """gather facts, only those named in fields if given"""
         data = {}
-        data[fact_name + "_passwordid"] = self.passwordid
-        data[fact_name + "_password"] = self.password
-        data[fact_name + "_username"] = self.username
-        data[fact_name + "_title"] = self.title
-        data[fact_name + "_hostname"] = self.hostname
-        data[fact_name + "_domain"] = self.domain
-        data[fact_name + "_description"] = self.description
-        data[fact_name + "_notes"] = self.notes
-        data[fact_name + "_url"] = self.url
-        data[fact_name + "_accounttype"] = self.accounttype
-        data[fact_name + "_accounttypeid"] = self.accounttypeid
-        data[fact_name + "_genericfield1"] = self.genericfield1
-        data[fact_name + "_genericfield2"] = self.genericfield2
-        data[fact_name + "_genericfield3"] = self.genericfield3
-        data[fact_name + "_genericfield4"] = self.genericfield4
-        data[fact_name + "_genericfield5"] = self.genericfield5
-        data[fact_name + "_genericfield6"] = self.genericfield6
-        data[fact_name + "_genericfield7"] = self.genericfield7
-        data[fact_name + "_genericfield8"] = self.genericfield8
-        data[fact_name + "_genericfield9"] = self.genericfield9
-        data[fact_name + "_genericfield10"] = self.genericfield10
-        data[fact_name + "_genericfieldinfo"] = self.genericfieldinfo
-        data[fact_name + "_expirydate"] = self.expirydate
+        for field in fields or FACTS:
+            data[fact_name + "_" + field] = getattr(self, field)
         return data
 
 
-class PasswordState(object):
-    """PasswordState"""
-
-    def __init__(self, module, url, api_key, api_username=None, api_password=None):
-        self.module = module
-        self.url = url
-        self.api_key = api_key
-        self.api_username = api_username
-        self.api_password = api_password
-
-    def get_password_fields(self, password):
-        """get the password fields"""
-        if password.type == "password_id":
-            return self._get_password_by_id(password.password_id)
-        elif password.type == "match_field":
-            return self._get_password_by_field(password)
-
-    def _get_password_by_id(self, password_id):
-        """get the password by the password id"""
-        passwords = self._request("passwords/" + str(password_id), "GET")
-        if len(passwords) == 0:
-            self.module.fail_json(msg="Password not found")
-            return None
-        if len(passwords) > 1:
-            self.module.fail_json(msg="Multiple matching passwords found")
-            return None
-        return passwords[0]
-
-    def _get_password_by_field(self, password):
-        """get the password by a specific field"""
-        return self._get_password_by_id(self._get_password_id(password))
-
-    def _get_password_id(self, password):
-        """get the password id by using a specific field"""
-        uri = (
-            "passwords/" + password.password_list_id + "?QueryAll&ExcludePassword=true"
-        )
-        passwords = self._request(uri, "GET")
-        if (
-            hasattr(password, "match_field") and hasattr(password, "match_field_id")
-        ) and (
-            hasattr(password, "match_field2") and hasattr(password, "match_field2_id")
-        ):
-            passwords = PasswordState._filter_passwords_fields(
-                passwords,
-                password.match_field,
-                password.match_field_id,
-                password.match_field2,
-                password.match_field2_id,
-            )
-        elif hasattr(password, "match_field") and hasattr(password, "match_field_id"):
-            passwords = PasswordState._filter_passwords_field(
-                passwords, password.match_field, password.match_field_id
-            )
-        elif hasattr(password, "match_field2") and hasattr(password, "match_field2_id"):
-            passwords = PasswordState._filter_passwords_field2(
-                passwords, password.match_field2, password.match_field2_id
-            )
-        if len(passwords) == 0:
-            self.module.fail_json(msg="Password not found")
-            return None
-        elif len(passwords) > 1:
-            self.module.fail_json(msg="Multiple matching passwords found")
-            return None
-
-        return passwords[0]["PasswordID"]
-
-    def _request(self, uri, method, params=None):
-        """send a request to the api and return as json"""
-        request_methods = {
-            "GET": requests.get,
-            "PUT": requests.put,
-            "POST": requests.post,
-        }
+def gather_facts(api, password_list_id, lookups, max_workers=1, fields=None):
+    """gather the facts of every lookup, sharing list downloads between them
 
+    The password lists shared by several lookups are downloaded first, then
+    the lookups are resolved, both on a thread pool of at most max_workers threads.
+    Facts and errors are returned in the order of the lookups; a failing
+    lookup does not stop the others. Only the facts in fields are gathered
+    if given, without fetching the passwords unless asked for.
+    """
+    exclude_password = fields is not None and "password" not in fields
+    passwords = []
+    errors = [None] * len(lookups)
+    for i, lookup in enumerate(lookups):
         try:
-            if self.api_key != None:
-                full_uri = self.url + "/api/" + uri
-                headers = {"APIKey": self.api_key}
-                response = request_methods[method](
-                    full_uri, headers=headers, params=params
-                )
-            else:
-                full_uri = self.url + "/winapi/" + uri
-                winauth = HttpNtlmAuth(self.api_username, self.api_password)
-                response = request_methods[method](
-                    full_uri, auth=winauth, params=params
-                )
-        except requests.exceptions.RequestException as inst:
-            self.module.fail_json(msg="Failed: %s" % str(inst))
-            return None
+            password = Password(
+                api,
+                lookup["password_list_id"] or password_list_id,
+                {
+                    "id": lookup["password_id"],
+                    "field": lookup["match_field"],
+                    "field_id": lookup["match_field_id"],
+                    "field2": lookup["match_field2"],
+                    "field2_id": lookup["match_field2_id"],
+                },
+                exclude_password=exclude_password,
+            )
+        except PasswordIdException as inst:
+            password = None
+            errors[i] = inst.msg
+        passwords.append(password)
 
-        if response.status_code > 204:
-            self.module.fail_json(msg="Failed: %s" % str(response.json()))
+    def gather(i):
+        if passwords[i] is None:
             return None
-
         try:
-            return response.json()
-        except JSONDecodeError as inst:
-            self.module.fail_json(msg="Failed: %s" % str(inst))
+            return passwords[i].gather_facts(lookups[i]["fact_name"], fields)
+        except PasswordStateException as inst:
+            errors[i] = inst.msg
             return None
 
-    @staticmethod
-    def _filter_passwords_fields(passwords, field, value, field2, value2):
-        """filter out passwords which does not match the specific field value and field2 value"""
-        return [
-            obj
-            for i, obj in enumerate(passwords)
-            if obj[field] == value and obj[field2] == value2
-        ]
-
-    @staticmethod
-    def _filter_passwords_field(passwords, field, value):
-        """filter out passwords which does not match the specific field value"""
-        return [obj for i, obj in enumerate(passwords) if obj[field] == value]
-
-    @staticmethod
-    def _filter_passwords_field2(passwords, field2, value2):
-        """filter out passwords which does not match the specific field2 value"""
-        return [obj for i, obj in enumerate(passwords) if obj[field2] == value2]
+    # create the shared session before the workers start using it
+    api.session
+    facts = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list_errors = api.download_lists(passwords, executor)
+        for i, password in enumerate(passwords):
+            if password is None or password.type != "match_field":
+                continue
+            if password.password_list_id in list_errors:
+                passwords[i] = None
+                errors[i] = list_errors[password.password_list_id]
+
+        for result in executor.map(gather, range(len(lookups))):
+            if result is not None:
+                facts.update(result)
+
+    errors = [
+        {"fact_name": lookup["fact_name"], "msg": msg}
+        for lookup, msg in zip(lookups, errors)
+        if msg is not None
+    ]
+    return facts, errors
 
 
 def main():
@@ -312,7 +232,13 @@ def main():
     module = AnsibleModule(
         argument_spec={
             "url": {"required": True},
-            "fact_name": {"required": True},
+            "fact_name": {"required": False},
+            "fields": {
+                "required": False,
+                "type": "list",
+                "elements": "str",
+                "choices": list(FACTS),
+            },
             "api_key": {"required": False},
             "api_username": {"required": False},
             "api_password": {"required": False},
@@ -322,10 +248,38 @@ def main():
             "match_field2": {"required": False},
             "match_field2_id": {"required": False},
             "password_id": {"required": False},
+            "pool_size": {"required": False, "type": "int", "default": 10},
+            "retries": {"required": False, "type": "int", "default": 3},
+            "retry_backoff": {"required": False, "type": "float", "default": 1.0},
+            "rate_limit": {"required": False, "type": "float"},
+            "stats": {"required": False, "type": "bool", "default": False},
+            "stats_path": {"required": False, "type": "path"},
+            "max_workers": {"required": False, "type": "int", "default": 4},
+            "lookup_strategy": {
+                "required": False,
+                "default": "auto",
+                "choices": ["auto", "search", "list"],
+            },
+            "cache_path": {"required": False, "type": "path"},
+            "cache_ttl": {"required": False, "type": "int", "default": 300},
+            "lookups": {
+                "required": False,
+                "type": "list",
+                "elements": "dict",
+                "options": {
+                    "fact_name": {"required": True},
+                    "password_list_id": {"required": False},
+                    "match_field": {"required": False},
+                    "match_field_id": {"required": False},
+                    "match_field2": {"required": False},
+                    "match_field2_id": {"required": False},
+                    "password_id": {"required": False},
+                },
+            },
         },
-        supports_check_mode=False,
-        mutually_exclusive=[("api_key", "api_username")],
-        required_one_of=[("api_key", "api_username")],
+        supports_check_mode=True,
+        mutually_exclusive=[("api_key", "api_username"), ("fact_name", "lookups")],
+        required_one_of=[("api_key", "api_username"), ("fact_name", "lookups")],
         required_together=[("api_username", "api_password")],
     )
 
@@ -334,28 +288,77 @@ def main():
     api_username = module.params["api_username"]
     api_password = module.params["api_password"]
     fact_name = module.params["fact_name"]
+    fields = module.params["fields"]
     password_list_id = module.params["password_list_id"]
     match_field = module.params["match_field"]
     match_field_id = module.params["match_field_id"]
     match_field2 = module.params["match_field2"]
     match_field2_id = module.params["match_field2_id"]
     password_id = module.params["password_id"]
-
-    api = PasswordState(module, url, api_key, api_username, api_password)
-    password = Password(
-        api,
-        password_list_id,
-        {
-            "id": password_id,
-            "field": match_field,
-            "field_id": match_field_id,
-            "field2": match_field2,
-            "field2_id": match_field2_id,
-        },
+    pool_size = module.params["pool_size"]
+    retries = module.params["retries"]
+    retry_backoff = module.params["retry_backoff"]
+    rate_limit = module.params["rate_limit"]
+    stats = None
+    if module.params["stats"] or module.params["stats_path"]:
+        stats = RequestStats(module.params["stats_path"])
+    max_workers = module.params["max_workers"]
+    lookup_strategy = module.params["lookup_strategy"]
+    lookups = module.params["lookups"]
+    cache_path = module.params["cache_path"]
+    cache_ttl = module.params["cache_ttl"]
+
+    cache = None
+    if cache_path is not None:
+        if not HAS_CRYPTOGRAPHY:
+            module.fail_json(msg=missing_required_lib("cryptography"))
+        secret = cache_secret(api_key, api_username, api_password)
+        cache = ListCache(cache_path, cache_ttl, secret, url)
+
+    api = PasswordState(
+        url,
+        api_key,
+        api_username,
+        api_password,
+        pool_size=pool_size,
+        retries=retries,
+        retry_backoff=retry_backoff,
+        rate_limit=rate_limit,
+        stats=stats,
+        cache=cache,
+        lookup_strategy=lookup_strategy,
     )
+    if lookups is None:
+        lookups = [
+            {
+                "fact_name": fact_name,
+                "password_list_id": None,
+                "match_field": match_field,
+                "match_field_id": match_field_id,
+                "match_field2": match_field2,
+                "match_field2_id": match_field2_id,
+                "password_id": password_id,
+            }
+        ]
 
-    facts = password.gather_facts(fact_name)
+    try:
+        facts, errors = gather_facts(
+            api, password_list_id, lookups, max_workers, fields
+        )
+    except PasswordStateException as inst:
+        module.fail_json(msg=inst.msg, **api.stats_result())
+    if len(errors) == 1 and len(lookups) == 1:
+        module.fail_json(msg=errors[0]["msg"], **api.stats_result())
+    elif errors:
+        module.fail_json(
+            msg="Failed to gather %d of %d lookups" % (len(errors), len(lookups)),
+            errors=errors,
+            **api.stats_result()
+        )
     facts_result = {"changed": False, "ansible_facts": facts}
+    if cache is not None:
+        facts_result["cache"] = cache.counters()
+    facts_result.update(api.stats_result())
     module.exit_json(**facts_result)
 
 
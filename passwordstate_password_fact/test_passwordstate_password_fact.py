@@ -4,14 +4,17 @@ import unittest
 
 from passwordstate_password_fact import Password
 from passwordstate_password_fact import PasswordState
-from ddt import ddt, data, unpack
+from passwordstate_password_fact import PasswordIdException
+from ansible.module_utils.passwordstate.client import PasswordListIdException
+from passwordstate_password_fact import gather_facts
+from testhelpers import make_response
 import mock
 
 
 class PasswordTest(unittest.TestCase):
     """PasswordTest"""
 
-    @mock.patch("requests.get", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
     def test_gather_facts_id(self, mock_get):
         """gather facts by id"""
         value = [
@@ -41,13 +44,12 @@ class PasswordTest(unittest.TestCase):
                 "ExpiryDate": "2051-05-12",
             }
         ]
-        mock_get.return_value = mock.Mock(status_code=200, json=lambda: value)
+        mock_get.return_value = make_response(value)
 
-        module = mock.Mock()
         url = "http://passwordstate"
         api_key = "abc123xyz"
 
-        api = PasswordState(module, url, api_key)
+        api = PasswordState(url, api_key)
         password = Password(api, "123", {"id": "999", "field": None, "field_id": None})
 
         facts = password.gather_facts("fact_name_prefix")
@@ -79,7 +81,7 @@ class PasswordTest(unittest.TestCase):
         self.maxDiff = None
         self.assertEqual(expected, facts)
 
-    @mock.patch("requests.get", autospec=True)
+    @mock.patch("requests.Session.get", autospec=True)
     def test_gather_facts_field(self, mock_get):
         """gather facts by custom field with field_id"""
         value = [
@@ -109,13 +111,12 @@ class PasswordTest(unittest.TestCase):
                 "ExpiryDate": "2051-05-12",
             }
         ]
-        mock_get.return_value = mock.Mock(status_code=200, json=lambda: value)
+        mock_get.return_value = make_response(value)
 
-        module = mock.Mock()
         url = "http://passwordstate"
         api_key = "abc123xyz"
 
-        api = PasswordState(module, url, api_key)
+        api = PasswordState(url, api_key)
         password = Password(
             api,
             "123",
@@ -156,3 +157,344 @@ class PasswordTest(unittest.TestCase):
         }
         self.maxDiff = None
         self.assertEqual(expected, facts)
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_gather_facts_field_requests(self, mock_get):
+        """gather facts by custom field fetches list and record only once"""
+        value = [{"PasswordID": 998, "Password": "foo", "GenericField1": "123"}]
+        mock_get.return_value = make_response(value)
+
+        api = PasswordState("http://passwordstate", "abc123xyz")
+        password = Password(
+            api,
+            "123",
+            {
+                "id": None,
+                "field": "GenericField1",
+                "field_id": "123",
+                "field2": None,
+                "field2_id": None,
+            },
+        )
+
+        self.assertEqual(998, password.passwordid)
+        self.assertEqual("foo", password.password)
+        self.assertEqual(2, mock_get.call_count)
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_refresh(self, mock_get):
+        """refresh re-reads the password record"""
+        mock_get.return_value = make_response([{"Password": "foo"}])
+
+        api = PasswordState("http://passwordstate", "abc123xyz")
+        password = Password(api, "123", {"id": "999", "field": None, "field_id": None})
+
+        self.assertEqual("foo", password.password)
+        mock_get.return_value = make_response([{"Password": "bar"}])
+        self.assertEqual("foo", password.password)
+        password.refresh()
+        self.assertEqual("bar", password.password)
+        self.assertEqual(2, mock_get.call_count)
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_gather_facts_lookups_list_error(self, mock_get):
+        """a failing list download fails only the lookups on that list"""
+
+        def get(session, uri, params=None, stream=False):
+            if uri.endswith("searchpasswords/1"):
+                return make_response([])
+            if "QueryAll" in uri:
+                return make_response("list error", 500)
+            record = dict.fromkeys(FIELDS, "")
+            record.update({"PasswordID": 7, "Password": "pw", "GenericField1": ""})
+            return make_response([record])
+
+        mock_get.side_effect = get
+
+        api = PasswordState("http://passwordstate", "abc123xyz")
+        lookup = dict.fromkeys(
+            ["match_field2", "match_field2_id", "password_id"],
+        )
+        lookups = [
+            dict(
+                lookup,
+                fact_name="a",
+                password_list_id="2",
+                match_field="GenericField1",
+                match_field_id="x",
+            ),
+            dict(
+                lookup,
+                fact_name="b",
+                password_list_id="1",
+                match_field="GenericField1",
+                match_field_id="x",
+            ),
+            dict(
+                lookup,
+                fact_name="c",
+                password_list_id="2",
+                match_field="GenericField1",
+                match_field_id="y",
+            ),
+        ]
+
+        facts, errors = gather_facts(api, None, lookups, max_workers=2)
+
+        self.assertEqual({}, facts)
+        self.assertEqual(
+            [
+                {"fact_name": "a", "msg": "Failed: list error"},
+                {"fact_name": "b", "msg": "Password not found"},
+                {"fact_name": "c", "msg": "Failed: list error"},
+            ],
+            errors,
+        )
+        self.assertEqual(2, mock_get.call_count)
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_lookup_strategy(self, mock_get):
+        """auto searches single lookups and downloads lists shared by several"""
+        mock_get.side_effect = lambda *args, **kwargs: make_response([])
+
+        lookup = dict.fromkeys(
+            ["password_list_id", "match_field2", "match_field2_id", "password_id"],
+        )
+        lookups = [
+            dict(lookup, fact_name="a", match_field="Title", match_field_id="x"),
+            dict(lookup, fact_name="b", match_field="Title", match_field_id="y"),
+        ]
+        expected = {
+            "auto": [
+                "http://passwordstate/api/searchpasswords/1",
+                "http://passwordstate/api/passwords/2?QueryAll&ExcludePassword=true",
+            ],
+            "search": [
+                "http://passwordstate/api/searchpasswords/1",
+                "http://passwordstate/api/searchpasswords/2",
+                "http://passwordstate/api/searchpasswords/2",
+            ],
+            "list": [
+                "http://passwordstate/api/passwords/1?QueryAll&ExcludePassword=true",
+                "http://passwordstate/api/passwords/2?QueryAll&ExcludePassword=true",
+            ],
+        }
+        for strategy, uris in expected.items():
+            mock_get.reset_mock()
+            api = PasswordState("http://passwordstate", "abc", lookup_strategy=strategy)
+            gather_facts(api, "1", lookups[:1], max_workers=1)
+            gather_facts(api, "2", lookups, max_workers=1)
+            self.assertEqual(
+                uris, [call[0][1] for call in mock_get.call_args_list], strategy
+            )
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_search_passwords(self, mock_get):
+        """search sends the match fields and keeps exact matches only"""
+        mock_get.return_value = mock.Mock(
+            status_code=200,
+            json=lambda: [
+                {"PasswordID": 1, "Title": "web", "UserName": "admin"},
+                {"PasswordID": 2, "Title": "web01", "UserName": "admin"},
+            ],
+        )
+        api = PasswordState("http://passwordstate", "abc")
+        password = Password(
+            api,
+            "5",
+            {
+                "id": None,
+                "field": "Title",
+                "field_id": "web",
+                "field2": "UserName",
+                "field2_id": "admin",
+            },
+        )
+
+        self.assertEqual(1, api._get_password_id(password))
+        mock_get.assert_called_once_with(
+            api.session,
+            "http://passwordstate/api/searchpasswords/5",
+            params={"Title": "web", "UserName": "admin", "ExcludePassword": "true"},
+        )
+
+
+# record fields not used by the lookup tests
+FIELDS = [
+    "UserName",
+    "Title",
+    "HostName",
+    "Domain",
+    "Description",
+    "Notes",
+    "URL",
+    "AccountType",
+    "AccountTypeID",
+    "GenericField2",
+    "GenericField3",
+    "GenericField4",
+    "GenericField5",
+    "GenericField6",
+    "GenericField7",
+    "GenericField8",
+    "GenericField9",
+    "GenericField10",
+    "GenericFieldInfo",
+    "ExpiryDate",
+]
+
+
+class GatherFactsTest(unittest.TestCase):
+    """GatherFactsTest"""
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_gather_facts_lookups(self, mock_get):
+        """lookups against one list share a single list download"""
+        entries = [
+            {"PasswordID": 1, "GenericField1": "a", "Password": "pw1"},
+            {"PasswordID": 2, "GenericField1": "b", "Password": "pw2"},
+        ]
+
+        def get(session, uri, params=None, stream=False):
+            if "QueryAll" in uri:
+                return make_response(entries)
+            pid = int(uri.rsplit("/", 1)[1])
+            record = dict(entries[pid - 1])
+            record.update(dict.fromkeys(FIELDS, ""))
+            return make_response([record])
+
+        mock_get.side_effect = get
+
+        api = PasswordState("http://passwordstate", "abc123xyz")
+        lookup = dict.fromkeys(
+            [
+                "password_list_id",
+                "match_field2",
+                "match_field2_id",
+                "password_id",
+            ]
+        )
+        lookups = [
+            dict(
+                lookup, fact_name="one", match_field="GenericField1", match_field_id="a"
+            ),
+            dict(
+                lookup, fact_name="two", match_field="GenericField1", match_field_id="b"
+            ),
+        ]
+
+        facts, errors = gather_facts(api, "123", lookups)
+
+        self.assertEqual(1, facts["one_passwordid"])
+        self.assertEqual("pw2", facts["two_password"])
+        self.assertEqual([], errors)
+        self.assertEqual(3, mock_get.call_count)
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_gather_facts_lookups_errors(self, mock_get):
+        """failing lookups are reported in order without stopping the others"""
+
+        def get(session, uri, params=None, stream=False):
+            if uri.endswith("/404"):
+                return make_response([])
+            record = dict.fromkeys(FIELDS, "")
+            record.update(
+                {
+                    "PasswordID": int(uri.rsplit("/", 1)[1]),
+                    "Password": "pw",
+                    "GenericField1": "",
+                }
+            )
+            return make_response([record])
+
+        mock_get.side_effect = get
+
+        api = PasswordState("http://passwordstate", "abc123xyz")
+        lookup = dict.fromkeys(
+            [
+                "password_list_id",
+                "match_field",
+                "match_field_id",
+                "match_field2",
+                "match_field2_id",
+            ]
+        )
+        lookups = [
+            dict(lookup, fact_name="a", password_id="404"),
+            dict(lookup, fact_name="b", password_id="2"),
+            dict(lookup, fact_name="c", password_id=None),
+            dict(lookup, fact_name="d", password_id="4"),
+        ]
+
+        facts, errors = gather_facts(api, "123", lookups, max_workers=4)
+
+        self.assertEqual(2, facts["b_passwordid"])
+        self.assertEqual(4, facts["d_passwordid"])
+        self.assertEqual(
+            [
+                {"fact_name": "a", "msg": "Password not found"},
+                {"fact_name": "c", "msg": PasswordIdException.msg},
+            ],
+            errors,
+        )
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_gather_facts_lookups_no_list_id(self, mock_get):
+        """a match field lookup without a list id fails only itself"""
+        record = dict.fromkeys(FIELDS, "")
+        record.update({"PasswordID": 2, "Password": "pw", "GenericField1": ""})
+        mock_get.return_value = make_response([record])
+
+        api = PasswordState("http://passwordstate", "abc123xyz")
+        lookup = dict.fromkeys(
+            [
+                "password_list_id",
+                "password_id",
+                "match_field",
+                "match_field_id",
+                "match_field2",
+                "match_field2_id",
+            ]
+        )
+        lookups = [
+            dict(lookup, fact_name="a", match_field="Title", match_field_id="x"),
+            dict(lookup, fact_name="b", password_id="2"),
+        ]
+
+        facts, errors = gather_facts(api, None, lookups, max_workers=2)
+
+        self.assertEqual(2, facts["b_passwordid"])
+        self.assertEqual(
+            [{"fact_name": "a", "msg": PasswordListIdException.msg}], errors
+        )
+        mock_get.assert_called_once()
+
+    @mock.patch("requests.Session.get", autospec=True)
+    def test_gather_facts_fields(self, mock_get):
+        """only the requested facts are gathered, without the password"""
+        record = dict.fromkeys(FIELDS, "")
+        record.update(PasswordID=999, UserName="admin", Password="secret")
+        mock_get.return_value = make_response([record])
+
+        api = PasswordState("http://passwordstate", "abc123xyz")
+        lookup = dict.fromkeys(
+            [
+                "password_list_id",
+                "match_field",
+                "match_field_id",
+                "match_field2",
+                "match_field2_id",
+            ]
+        )
+        lookups = [dict(lookup, fact_name="db", password_id="999")]
+
+        facts, errors = gather_facts(
+            api, "123", lookups, fields=["passwordid", "username"]
+        )
+
+        self.assertEqual({"db_passwordid": 999, "db_username": "admin"}, facts)
+        self.assertEqual([], errors)
+        self.assertEqual({"ExcludePassword": "true"}, mock_get.call_args[1]["params"])
+
+        gather_facts(api, "123", lookups, fields=["password"])
+        self.assertIsNone(mock_get.call_args[1]["params"])
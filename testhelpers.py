@@ -0,0 +1,14 @@
+""" PasswordState test helpers """
+
+import io
+import json
+
+import requests
+
+
+def make_response(value, status_code=200):
+    """an api response with the given json body"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(json.dumps(value).encode("utf-8"))
+    return response